@@ -0,0 +1,210 @@
+"""
+Single-process asyncio runtime for the game server.
+
+paho's socket I/O is driven by the event loop, and each lobby has its own
+queue and task, so a lobby's messages are handled in order and lobbies
+take turns between messages. Messages are handled by the synchronous
+GameClient handlers, except for the turn itself: the view of each player
+is built and encoded as its own step, and the other lobbies run between
+steps, so a large lobby delays the rest by one player's work rather than
+a whole turn. Everything still shares one thread. Run
+GameInstanceManger.py to spread lobbies over worker processes when the
+total work outgrows one core.
+"""
+
+import asyncio
+
+import GameClient
+import transport
+from GameClient import ShardMessage, lobby_of
+
+
+class AsyncioHelper:
+    def __init__(self, loop: asyncio.AbstractEventLoop, client):
+        """
+        Drives paho's network I/O from the asyncio event loop instead of a loop_forever thread
+        """
+        self.loop = loop
+        self.client = client
+        self.misc = None
+        self.client.on_socket_open = self.on_socket_open
+        self.client.on_socket_close = self.on_socket_close
+        self.client.on_socket_register_write = self.on_socket_register_write
+        self.client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc is not None:
+            self.misc.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        # Keepalives and retries
+        while self.client.loop_misc() == 0:  # MQTT_ERR_SUCCESS
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+
+class BufferedClient():
+    def __init__(self):
+        """
+        Hosts the lobby state for the synchronous GameClient handlers and collects their publishes
+        so they can be sent as one batch
+        """
+        self.pending = []
+        self.due_turns = []
+        GameClient.init_server_state(self)
+        # Due turns are collected here and resolved by AsyncGameServer.run_turn
+        self.turn_runner = lambda client, lobby_name: self.due_turns.append(lobby_name)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.pending.append((topic, payload, qos, retain))
+
+    def take_pending(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+    def take_due_turns(self):
+        due_turns, self.due_turns = self.due_turns, []
+        return due_turns
+
+
+class AsyncGameServer():
+    def __init__(self, client):
+        """
+        Runs every lobby as its own task with its own queue, so each lobby's messages are handled in order.
+        Handlers run synchronously on the event loop, see the module docstring
+        :param client: a connected-or-connecting client from transport.create_client, its I/O is driven by this event loop
+        """
+        self.client = client
+        self.state = BufferedClient()
+        self.queues: dict[str, asyncio.Queue] = {}
+        self.client.on_message = self.on_message
+
+    def on_message(self, client, userdata, msg):
+        """
+        Called by paho from loop_read on the event loop, queues the message on its lobby's task
+        :param client: the client itself
+        :param userdata: userdata is set when initiating the client, here it is userdata=None
+        :param msg: the message with topic and payload
+        """
+        # Messages without a lobby share one queue so their validation errors are still reported
+        self.enqueue(lobby_of(msg.topic, msg.payload) or '', (msg.topic, msg.payload))
+
+    def enqueue(self, lobby_name: str, item: tuple):
+        queue = self.queues.get(lobby_name)
+        if queue is None:
+            queue = self.queues[lobby_name] = asyncio.Queue()
+            asyncio.get_running_loop().create_task(self.run_lobby(lobby_name, queue))
+        queue.put_nowait(item)
+
+    async def run_lobby(self, lobby_name: str, queue: asyncio.Queue):
+        while True:
+            topic, payload = await queue.get()
+            if topic is None:
+                await self.turn_deadline(lobby_name)
+            else:
+                await self.handle(topic, payload)
+
+            # Lobby is gone and nothing else is waiting: release its queue and task
+            if lobby_name not in self.state.team_dict and queue.empty():
+                self.queues.pop(lobby_name, None)
+                return
+
+    async def run_scheduler(self):
+        """
+        Advances the turn deadlines of every lobby once per tick
+        """
+        while True:
+            await asyncio.sleep(GameClient.TICK_SECONDS)
+            self.state.scheduler.advance()
+            await self.publish_batch(self.state.take_pending())
+            # Timed-out turns are resolved by their lobby's task, after the messages already queued for it
+            for lobby_name in self.state.take_due_turns():
+                self.enqueue(lobby_name, (None, None))
+
+    async def handle(self, topic: str, payload: bytes):
+        # Blocks the event loop for as long as the handler runs, which is short unless it completes a turn
+        GameClient.on_message(self.state, None, ShardMessage(topic, payload, 0))
+        await self.publish_batch(self.state.take_pending())
+        for lobby_name in self.state.take_due_turns():
+            await self.run_turn(lobby_name)
+
+    async def turn_deadline(self, lobby_name: str):
+        # The queued moves may have completed the turn since, which schedules the next deadline
+        if lobby_name in self.state.game_dict and lobby_name not in self.state.scheduler:
+            await self.run_turn(lobby_name)
+
+    async def run_turn(self, lobby_name: str):
+        """
+        GameClient.resolve_turn, handing the loop back to the other lobbies after each player's view
+        """
+        state = self.state
+        game = GameClient.play_turn(state, lobby_name)
+        messages = []
+        for player in list(game.all_players):
+            message = GameClient.game_state_message(state, lobby_name, player, game.getGameData(player))
+            if message is not None:
+                messages.append(message)
+            await asyncio.sleep(0)
+
+        # Another lobby's new_game may have evicted this one in the meantime
+        if state.game_dict.get(lobby_name) is not game:
+            return
+        # Queued together so the outbox never holds half a turn
+        for topic, payload, options in messages:
+            state.outbox.publish(topic, payload, **options)
+        GameClient.finish_turn(state, lobby_name, game)
+        await self.publish_batch(state.take_pending())
+
+    async def publish_batch(self, batch: list):
+        for topic, payload, qos, retain in batch:
+            self.client.publish(topic, payload, qos=qos, retain=retain)
+        # Hand the loop back so the writer callback can flush the whole batch to the socket
+        await asyncio.sleep(0)
+
+
+async def pump_loopback(client: transport.LoopbackClient):
+    """
+    A loopback client has no socket for the event loop to watch, so its callbacks are polled instead
+    """
+    while True:
+        client.loop(timeout=0)
+        await asyncio.sleep(0.001)
+
+
+async def main():
+    client = transport.create_client("AsyncGameClient")
+    server = AsyncGameServer(client)
+    loop = asyncio.get_running_loop()
+
+    if isinstance(client, transport.LoopbackClient):
+        loop.create_task(pump_loopback(client))
+    else:
+        AsyncioHelper(loop, client)
+
+    transport.connect(client)
+    for topic in GameClient.SUBSCRIPTIONS:
+        client.subscribe(topic)
+
+    try:
+        await server.run_scheduler()
+    finally:
+        # Stopping: the buffered turns would be lost with the process
+        GameClient.close_turn_logs(server.state)
+
+
+if __name__ == '__main__':
+    transport.require_remote_broker()
+    asyncio.run(main())
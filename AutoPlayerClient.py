@@ -1,132 +1,288 @@
 import os
+import sys
 import json
-from dotenv import load_dotenv
-import paho.mqtt.client as paho
-from paho import mqtt
+import math
 import time
 import random
+import argparse
+import threading
+from collections import deque
+
+import codec
+import transport
+from publisher import delivery
 
 # Define constants
-EMPTY_CELL = '-'
-TEAM_A = 'TeamA'
-TEAM_B = 'TeamB'
-
-class Map:
-    def __init__(self, height, width, players):
-        self.height = height
-        self.width = width
+MOVES = ["UP", "DOWN", "LEFT", "RIGHT"]
+TEAM_NAMES = ["TeamA", "TeamB"]
+PERCENTILES = (50, 90, 99)
+
+
+class Lobby():
+    def __init__(self, name: str, players: list, teams: dict, client):
+        """
+        Bot players of one lobby and the progress of its current turn
+        :param players: player names in join order
+        :param teams: {player_name: team_name}
+        :param client: the connection every bot of this lobby publishes on, so the server sees its messages in order
+        """
+        self.name = name
         self.players = players
-        self.map = [['-' for _ in range(width)] for _ in range(height)]
-
-    def __fillMap(self, playersList):
-        # Logic to fill the map
-        pass
-
-    def __placeRandom(self, item, choice):
-        if choice:
-            x, y = random.choice(choice)
-            self.map[y][x] = item
-
-    def placeWalls(self, wallChoices):
-        self.__placeRandom('Wall', wallChoices)
-
-# Callback functions
-def on_connect(client, userdata, flags, rc, properties=None):
-    print(f"Connected with result code {rc}")
-    # Subscribing to necessary topics
-    client.subscribe(f"games/{lobby_name}/lobby")
-    client.subscribe(f"games/{lobby_name}/game_state")
-    client.subscribe(f"games/{lobby_name}/scores")
-
-def on_message(client, userdata, msg):
-    print(f"Received message on topic {msg.topic}: {msg.payload.decode()}")
-    if msg.topic == f"games/{lobby_name}/game_state":
-        process_game_state(msg.payload.decode())
-
-def on_publish(client, userdata, mid):
-    print(f"Message published with mid {mid}")
-
-def on_subscribe(client, userdata, mid, granted_qos, properties=None):  # Modify here
-    print("Subscribed:", mid, granted_qos)
-
-def process_game_state(game_state):
-    # Convert the game state string to a dictionary
-    game_state_dict = json.loads(game_state)
-    board = game_state_dict.get('board')
-    print_board(board)
-
-def print_board(board):
-    # Print the game board
-    print("Current Board:")
-    for row in board:
-        print(" ".join(row))
-    print()
+        self.teams = teams
+        self.client = client
+        self.started = False
+        self.moves_sent = 0
+        self.last_move_at = None # When the last move of the current turn was sent
+        self.turns = 0
 
-if __name__ == '__main__':
-    load_dotenv(dotenv_path='./credentials.env')
-    
-    broker_address = os.environ.get('BROKER_ADDRESS')
-    broker_port = int(os.environ.get('BROKER_PORT'))
-    username = os.environ.get('USER_NAME')
-    password = os.environ.get('PASSWORD')
 
-    # Game setup variables
-    lobby_name = "TestLobby"  # This should be unique to your session
+class LoadGenerator():
+    def __init__(self, clients: list, num_lobbies: int, players_per_lobby: int, rate: float, encoding: str = codec.BINARY):
+        """
+        Drives bot players in many lobbies over a few multiplexed connections
+        :param clients: connected clients, lobbies are spread over them round robin
+        :param rate: target moves per second over every lobby, 0 for as fast as the server resolves turns
+        :param encoding: wire format the bots negotiate for game_state
+        """
+        self.clients = clients
+        self.players_per_lobby = players_per_lobby
+        self.rate = rate
+        self.encoding = encoding
+        self.run_id = f"load{random.randrange(16 ** 6):06x}" # Keeps lobbies of earlier runs and retained messages apart
+        self.lobbies: dict[str, Lobby] = {}
+        self.pending = deque() # (lobby, player_name) moves waiting for the rate limiter
+        self.lock = threading.Lock()
+        self.latencies = [] # Seconds from the last move of a turn to the server's scores for it, since the last report
+        self.all_latencies = []
+        self.counters = {'moves': 0, 'turns': 0, 'games': 0, 'errors': 0, 'messages': 0, 'bytes': 0}
+        self.generation = 0
 
-    # Define player names and team names
-    team_names = ["TeamA", "TeamB"]
-    player_names = ["Player1", "Player2", "Player3", "Player4"]
+        for client in clients:
+            client.on_message = self.on_message
 
-    # Shuffle the player names to distribute them evenly among teams
-    random.shuffle(player_names)
+        for i in range(num_lobbies):
+            self.open_lobby(clients[i % len(clients)])
 
-    # Initialize MQTT clients for each player
-    clients = []
-    for i, player_name in enumerate(player_names):
-        team_name = team_names[i % len(team_names)]
-        client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id=f"GameClient_{player_name}", userdata=None, protocol=paho.MQTTv5)        
-        client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-        client.username_pw_set(username, password)
-        client.on_connect = on_connect
-        client.on_message = on_message
-        client.on_publish = on_publish
-        client.on_subscribe = on_subscribe
-        clients.append((client, team_name))
-
-    # Connect each client to the MQTT broker
-    for client, _ in clients:
-        client.connect(broker_address, broker_port)
-
-    # Start the loop to process received messages
-    for client, _ in clients:
-        client.loop_start()
+    def open_lobby(self, client):
+        """
+        Joins a fresh lobby's bots and starts its game
+        """
+        self.generation += 1
+        name = f"{self.run_id}_{self.generation}"
+        players = [f"bot{i}" for i in range(self.players_per_lobby)]
+        teams = {player: TEAM_NAMES[i % len(TEAM_NAMES)] for i, player in enumerate(players)}
+        lobby = Lobby(name, players, teams, client)
+        with self.lock:
+            self.lobbies[name] = lobby
 
-    # Publish the new game command to join the lobby
-    for client, team_name in clients:
-        client.publish("new_game", json.dumps({
-            'lobby_name': lobby_name,
-            'team_name': team_name,
-            'player_name': client._client_id.decode()  # Convert bytes to string
-        }), qos=1)
+        # Each connection only subscribes to its own lobbies, so no message is received twice
+        client.subscribe(lobby_topics(name))
+        for player in players:
+            client.publish("new_game", json.dumps({
+                'lobby_name': name,
+                'team_name': teams[player],
+                'player_name': player,
+                'encoding': self.encoding
+            }), **delivery('control'))
+        client.publish(f"games/{name}/start", "START", **delivery('control'))
 
-    # Wait for the new game command to be processed by the server
-    time.sleep(1)
+    def on_message(self, client, userdata, msg):
+        """
+            Tracks the turns of every lobby ( used as callback for subscribe )
+            :param client: the client itself
+            :param userdata: userdata is set when initiating the client, here it is userdata=None
+            :param msg: the message with topic and payload
+        """
+        received_at = time.perf_counter()
+        levels = msg.topic.split('/')
+        lobby_name = levels[1]
+        with self.lock:
+            self.counters['messages'] += 1
+            self.counters['bytes'] += len(msg.payload)
+            lobby = self.lobbies.get(lobby_name)
+        # Finished lobbies and cleared retained messages
+        if lobby is None or not msg.payload:
+            return
 
-    # Publish a start command to begin the game
-    clients[0][0].publish(f"games/{lobby_name}/start", "START", qos=1)
+        if levels[-1] == 'lobby':
+            self.on_lobby_message(lobby, msg.payload.decode())
+        elif levels[-1] == 'updates':
+            names = codec.decodeBundle(msg.payload)
+            if 'scores' in names:
+                self.on_scores(lobby, received_at)
+            else:
+                self.on_game_state(lobby)
+        elif levels[-1] == 'scores':
+            self.on_scores(lobby, received_at)
+        else:
+            self.on_game_state(lobby)
 
-    try:
+    def on_game_state(self, lobby: Lobby):
+        # Views of the first turn come without scores
+        with self.lock:
+            if not lobby.started:
+                lobby.started = True
+                self.open_turn(lobby)
+
+    def on_scores(self, lobby: Lobby, received_at: float):
+        with self.lock:
+            if lobby.last_move_at is not None:
+                latency = received_at - lobby.last_move_at
+                self.latencies.append(latency)
+                self.all_latencies.append(latency)
+            lobby.turns += 1
+            self.counters['turns'] += 1
+            self.open_turn(lobby)
+
+    def on_lobby_message(self, lobby: Lobby, message: str):
+        if message.startswith("Game Over"):
+            with self.lock:
+                self.lobbies.pop(lobby.name, None)
+                self.counters['games'] += 1
+            lobby.client.unsubscribe([topic for topic, _ in lobby_topics(lobby.name)])
+            # Keep the number of running lobbies constant
+            self.open_lobby(lobby.client)
+        elif message.startswith("{"): # Errors are JSON objects
+            with self.lock:
+                self.counters['errors'] += 1
+
+    def open_turn(self, lobby: Lobby):
+        # Called with the lock held
+        lobby.moves_sent = 0
+        lobby.last_move_at = None
+        self.pending.extend((lobby, player) for player in lobby.players)
+
+    def send_moves(self, budget: int) -> int:
+        """
+        Publishes up to budget pending moves
+        :return: Number of moves sent
+        """
+        sent = 0
+        # Moves queued while sending wait for the next call, so a fast server can't keep this loop going
+        with self.lock:
+            budget = min(budget, len(self.pending))
+        for _ in range(budget):
+            with self.lock:
+                lobby, player = self.pending.popleft()
+                if lobby.name not in self.lobbies:
+                    continue
+            lobby.client.publish(f"games/{lobby.name}/{player}/move", random.choice(MOVES), **delivery('control'))
+            sent += 1
+            with self.lock:
+                lobby.moves_sent += 1
+                if lobby.moves_sent == len(lobby.players):
+                    lobby.last_move_at = time.perf_counter()
+                self.counters['moves'] += 1
+        return sent
+
+    def run(self, duration: float, report_every: float = 5.0):
+        """
+        Sends moves at the target rate for duration seconds, printing a report every report_every seconds
+        """
+        start = last_report = last_tick = time.perf_counter()
+        credit = 0.0
+        last_counters = dict(self.counters)
         while True:
-            # Simulate moves for each player
-            for client, _ in clients:
-                move_command = random.choice(["UP", "DOWN", "LEFT", "RIGHT"])
-                client.publish(f"games/{lobby_name}/{client._client_id.decode()}/move", move_command, qos=1)
-                time.sleep(1)  # Add delay between moves
+            now = time.perf_counter()
+            if now - start >= duration:
+                break
+            if self.rate > 0:
+                # Token bucket holding at most a second of moves
+                credit = min(credit + (now - last_tick) * self.rate, max(self.rate, 1))
+                last_tick = now
+                credit -= self.send_moves(int(credit))
+            else:
+                self.send_moves(sys.maxsize)
+            if now - last_report >= report_every:
+                last_counters = self.report(now - last_report, last_counters)
+                last_report = now
+            time.sleep(0.001)
+        self.report(time.perf_counter() - last_report, last_counters)
+        self.summary(time.perf_counter() - start)
+
+    def report(self, elapsed: float, last_counters: dict) -> dict:
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            counters = dict(self.counters)
+        rates = {key: (counters[key] - last_counters[key]) / elapsed for key in ('moves', 'turns', 'messages')}
+        print(f"moves/s {rates['moves']:9.1f}  turns/s {rates['turns']:8.1f}  msgs in/s {rates['messages']:9.1f}  "
+              f"lobbies {len(self.lobbies)}  turn latency {format_latencies(latencies)}")
+        return counters
+
+    def summary(self, elapsed: float):
+        with self.lock:
+            latencies = list(self.all_latencies)
+            counters = dict(self.counters)
+        print(f"\n{elapsed:.1f}s, {len(self.lobbies)} lobbies x {self.players_per_lobby} players, "
+              f"{len(self.clients)} connection(s)")
+        print(f"moves {counters['moves']} ({counters['moves'] / elapsed:.1f}/s), turns {counters['turns']} "
+              f"({counters['turns'] / elapsed:.1f}/s), finished games {counters['games']}, errors {counters['errors']}")
+        print(f"received {counters['messages']} messages, {counters['bytes']} bytes")
+        print(f"turn latency {format_latencies(latencies)}")
+
 
-            time.sleep(10)  # Wait for the game to progress
+def lobby_topics(lobby_name: str) -> list:
+    return [(f"games/{lobby_name}/{topic}", 1) for topic in ("lobby", "+/game_state", "scores", "updates")]
 
+
+def percentile(ordered: list, pct: float) -> float:
+    # Nearest rank
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def format_latencies(latencies: list) -> str:
+    if not latencies:
+        return "n/a"
+    ordered = sorted(latencies)
+    parts = [f"p{pct} {percentile(ordered, pct) * 1000:.2f}ms" for pct in PERCENTILES]
+    parts.append(f"max {ordered[-1] * 1000:.2f}ms")
+    return ", ".join(parts)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bot swarm that plays many lobbies at once and reports the server's turn latency")
+    parser.add_argument('--lobbies', type=int, default=10, help="lobbies played at once")
+    parser.add_argument('--players', type=int, default=4, help="bot players per lobby")
+    parser.add_argument('--rate', type=float, default=0, help="target moves per second over every lobby, 0 for unthrottled")
+    parser.add_argument('--connections', type=int, default=1, help="connections the bots are multiplexed over")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--report-every', type=float, default=5, help="seconds between reports")
+    parser.add_argument('--encoding', choices=codec.ENCODINGS, default=codec.BINARY, help="game_state wire format")
+    parser.add_argument('--serve', action='store_true',
+                        help="run the game server in this process over the loopback transport, to measure it without a network")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    broker = None
+    if args.serve:
+        # A measurement starts from no lobbies and doesn't write files, unless the environment asks for it
+        os.environ.setdefault('CHECKPOINT_INTERVAL', '0')
+        os.environ.setdefault('TURN_LOG_DIR', '')
+        import GameClient
+        broker = transport.LoopbackBroker()
+        server = GameClient.create_server(broker=broker)
+        threading.Thread(target=GameClient.serve, args=(server,), daemon=True).start()
+    else:
+        transport.require_remote_broker()
+
+    # Initialize the multiplexed connections
+    clients = []
+    for i in range(args.connections):
+        client = transport.create_client(f"AutoPlayer_{i}", broker=broker)
+        transport.connect(client)
+        client.loop_start()
+        clients.append(client)
+
+    generator = LoadGenerator(clients, args.lobbies, args.players, args.rate, args.encoding)
+    try:
+        generator.run(args.duration, args.report_every)
     except KeyboardInterrupt:
-        # Stop the loop and disconnect on keyboard interrupt
-        for client, _ in clients:
-            client.loop_stop()
-            client.disconnect()
+        print("Load generation interrupted by user.")
+
+    # Stop the loop and disconnect
+    for client in clients:
+        client.loop_stop()
+        client.disconnect()
@@ -1,15 +1,66 @@
 import os
+import sys
 import json
-import copy
-from collections import OrderedDict
+import time
+import struct
+import signal
+import traceback
+from collections import namedtuple
 
-import paho.mqtt.client as paho
-from paho import mqtt
-from dotenv import load_dotenv
-
-from InputTypes import NewPlayer
 from game import Game
+from deltas import ViewTracker
+from scheduler import TimerWheel
+from lobbies import LobbyRegistry
+from router import TopicRouter
+from publisher import PublishBatch, PACKED_SUFFIX, delivery
+from metrics import Metrics
+import codec
+import transport
+from validation import InputError, lobbyNameOf, parseMove, parseNewPlayer
+from checkpoint import Checkpointer, readCheckpoint
 from moveset import Moveset
+import snapshot
+from turnlog import TurnLog, TurnLogWriter, logPath
+from warmpool import WarmPool
+
+# Seconds a lobby waits for every move before players without one stay put, and the scheduler resolution
+TURN_TIMEOUT = float(os.environ.get('TURN_TIMEOUT', 5))
+TICK_SECONDS = float(os.environ.get('TICK_MS', 100)) / 1000
+
+# Bounds on resident lobbies: count, seconds idle before eviction and seconds between eviction sweeps
+MAX_LOBBIES = int(os.environ.get('MAX_LOBBIES', 1000))
+LOBBY_TTL = float(os.environ.get('LOBBY_TTL', 600))
+EVICTION_INTERVAL = 10.0
+
+# Seconds between attempts to reconnect to the broker, doubling after each failure up to the maximum
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+# Set GAME_VERBOSE=1 to print every incoming message, publish and board
+VERBOSE = os.environ.get('GAME_VERBOSE', '') not in ('', '0')
+
+# Seconds between server stats reports (0 disables them), published on STATS_TOPIC and appended to STATS_FILE if set
+STATS_INTERVAL = float(os.environ.get('STATS_INTERVAL', 10))
+STATS_TOPIC = os.environ.get('STATS_TOPIC', 'server/stats')
+STATS_FILE = os.environ.get('STATS_FILE', '')
+
+# Lobbies are checkpointed to CHECKPOINT_FILE every CHECKPOINT_INTERVAL seconds and restored on startup, 0 disables it
+CHECKPOINT_FILE = os.environ.get('CHECKPOINT_FILE', 'lobbies.checkpoint')
+CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', 5))
+
+# Every game's seed, initial board and moves are appended to a log in TURN_LOG_DIR ('' disables it), see replay.py
+TURN_LOG_DIR = os.environ.get('TURN_LOG_DIR', 'turn_logs')
+TURN_LOG_FLUSH_INTERVAL = 1.0
+
+# Set PACK_UPDATES=1 to send each lobby's end-of-turn messages as one bundle on games/{lobby}/updates,
+# without it every player's game_state is its own publish, see publisher.py
+PACK_UPDATES = os.environ.get('PACK_UPDATES', '') not in ('', '0')
+
+# Board size of new games. WARM_POOL_WORKERS processes keep WARM_POOL_DEPTH boards of that size ready (0 disables it)
+BOARD_HEIGHT = int(os.environ.get('BOARD_HEIGHT', 10))
+BOARD_WIDTH = int(os.environ.get('BOARD_WIDTH', 10))
+WARM_POOL_WORKERS = int(os.environ.get('WARM_POOL_WORKERS', 1))
+WARM_POOL_DEPTH = int(os.environ.get('WARM_POOL_DEPTH', 8))
 
 # setting callbacks for different events to see if it works, print the message etc.
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -57,33 +108,63 @@ def on_message(client, userdata, msg):
         :param userdata: userdata is set when initiating the client, here it is userdata=None
         :param msg: the message with topic and payload
     """
-    print("message: " + msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
-    topic_list = msg.topic.split("/")
+    if VERBOSE:
+        print("message: " + msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
 
     # Validate it is input we can deal with
-    if topic_list[-1] in dispatch.keys(): 
-        dispatch[topic_list[-1]](client, topic_list, msg.payload)
+    route = router.match(msg.topic)
+    if route is None:
+        client.metrics.count('in.unrouted')
+        return
+    handler, captures = route
+    client.metrics.count(f'in.{handler.__name__}')
+    try:
+        with client.metrics.timer(f'handler.{handler.__name__}'):
+            handler(client, captures, msg.payload)
+    except Exception:
+        # A failing handler must not take the network loop down with it
+        client.metrics.count(f'errors.{handler.__name__}')
+        traceback.print_exc()
 
 
 
 # Dispatched function, adds player to a lobby & team
-def add_player(client, topic_list, msg_payload):
+def add_player(client, captures, msg_payload):
     # Parse and Validate Input Data
     try:
-        player = NewPlayer(**json.loads(msg_payload))
-    except:
-        print("ValidationError in create_game")
+        player = parseNewPlayer(msg_payload)
+    except InputError as e:
+        if e.lobbyName is not None:
+            publish_error_to_lobby(client, e.lobbyName, e)
         return
     
     # If lobby doesn't exists...
     if player.lobby_name not in client.team_dict.keys():
+        admitted, evicted = client.lobbies.admit(player.lobby_name)
+        if evicted is not None:
+            evict_lobby(client, evicted)
+        if not admitted:
+            publish_error_to_lobby(client, player.lobby_name,
+                                   InputError('server_full', "Server is full, please try again later"))
+            return
         client.team_dict[player.lobby_name] = {}
         client.team_dict[player.lobby_name]['started'] = False
+        client.view_dict[player.lobby_name] = ViewTracker()
+        client.encoding_dict[player.lobby_name] = {}
+    else:
+        client.lobbies.touch(player.lobby_name)
 
     if client.team_dict[player.lobby_name]['started']:
-        publish_error_to_lobby(client, player.lobby_name, "Game has already started, please make a new lobby")
+        publish_error_to_lobby(client, player.lobby_name,
+                               InputError('game_started', "Game has already started, please make a new lobby"),
+                               player.player_name)
+        return
 
     add_team(client, player)
+    mark_dirty(client, player.lobby_name)
+    if player.delta:
+        client.view_dict[player.lobby_name].enable(player.player_name)
+    client.encoding_dict[player.lobby_name][player.player_name] = player.encoding
 
     print(f'Added Player: {player.player_name} to Team: {player.team_name}')
 
@@ -96,122 +177,462 @@ def add_team(client, player):
     else:
         client.team_dict[player.lobby_name][player.team_name].append(player.player_name)
 
-move_to_Moveset = {
-    'UP' : Moveset.UP,
-    'DOWN' : Moveset.DOWN,
-    'LEFT' : Moveset.LEFT,
-    'RIGHT' : Moveset.RIGHT
-}
-
 # Dispatched Function: handles player movement commands
-def player_move(client, topic_list, msg_payload):
-    lobby_name = topic_list[1]
-    player_name = topic_list[2]
-    if lobby_name in client.team_dict.keys():
-        try:
-            new_move = msg_payload.decode()
-
-            client.move_dict[lobby_name][player_name] = (player_name, move_to_Moveset[new_move])
-            game: Game = client.game_dict[lobby_name]
-
-            # If all players made a move, resolve movement
-            if len(game.all_players) == len(client.move_dict[lobby_name]):
-                for player, move in client.move_dict[lobby_name].values():
-                    game.movePlayer(player, move)
-
-                # Publish player states after all movement is resolved
-                for player, _ in client.move_dict[lobby_name].values():
-                    client.publish(f'games/{lobby_name}/{player}/game_state', json.dumps(game.getGameData(player)))
-
-                # Clear move list
-                client.move_dict[lobby_name].clear()
-                print(game.map)
-                client.publish(f'games/{lobby_name}/scores', json.dumps(game.getScores()))
-                if game.gameOver():
-                    # Publish game over, remove game
-                    publish_to_lobby(client, lobby_name, "Game Over: All coins have been collected")
-                    client.team_dict.pop(lobby_name)
-                    client.move_dict.pop(lobby_name)
-                    client.game_dict.pop(lobby_name)
-
-        except Exception as e:
-            raise e
-            publish_error_to_lobby(client, lobby_name, e.__str__)
+def player_move(client, captures, msg_payload):
+    lobby_name, player_name = captures
+    game: Game = client.game_dict.get(lobby_name)
+    try:
+        if game is None:
+            if lobby_name in client.team_dict:
+                raise InputError('game_not_started', "Game has not started yet.")
+            raise InputError('lobby_not_found', "Lobby name not found.")
+        client.lobbies.touch(lobby_name)
+        if player_name not in game.all_players:
+            raise InputError('unknown_player', "Player is not in this game.")
+        move = parseMove(msg_payload)
+    except InputError as e:
+        publish_error_to_lobby(client, lobby_name, e, player_name)
+        return
+
+    client.move_dict[lobby_name][player_name] = move
+    mark_dirty(client, lobby_name)
+
+    # If all players made a move, resolve movement
+    if len(game.all_players) == len(client.move_dict[lobby_name]):
+        client.turn_runner(client, lobby_name)
+
+
+# Resolves the current turn of a lobby, players that haven't sent a move stay put
+def resolve_turn(client, lobby_name):
+    game = play_turn(client, lobby_name)
+
+    # Publish player states after all movement is resolved
+    publish_game_states(client, lobby_name, game)
+    finish_turn(client, lobby_name, game)
+
+
+# Applies the moves of the current turn to the game
+def play_turn(client, lobby_name):
+    game: Game = client.game_dict[lobby_name]
+    turn_log = client.turn_logs.get(lobby_name)
+    if turn_log is not None:
+        turn_log.turn(client.move_dict[lobby_name])
+    with client.metrics.timer('turn.resolve'):
+        game.resolveTurn(client.move_dict[lobby_name])
+    client.metrics.count('turns')
+    mark_dirty(client, lobby_name)
+    return game
+
+
+# Ends a turn once the player states are queued: publishes the turn, then ends the game or schedules the next turn
+def finish_turn(client, lobby_name, game):
+    # Clear move list
+    client.move_dict[lobby_name].clear()
+    if VERBOSE:
+        print(game.map)
+    publish_scores(client, lobby_name, game)
+    client.outbox.flush()
+    if game.gameOver():
+        # Publish game over, remove game
+        publish_to_lobby(client, lobby_name, "Game Over: All coins have been collected")
+        remove_lobby(client, lobby_name)
     else:
-        publish_error_to_lobby(client, lobby_name, "Lobby name not found.")
+        schedule_turn(client, lobby_name)
+
+
+def schedule_turn(client, lobby_name):
+    client.scheduler.schedule(lobby_name, TURN_TIMEOUT, lambda: turn_deadline(client, lobby_name))
+
+
+# Scheduler callback: the turn timed out
+def turn_deadline(client, lobby_name):
+    if lobby_name not in client.game_dict:
+        return
+    # Nobody moved, wait for another turn rather than publishing an unchanged board
+    if not client.move_dict[lobby_name]:
+        schedule_turn(client, lobby_name)
+        return
+    client.turn_runner(client, lobby_name)
 
 
 # Dispatched function: Instantiates Game object
-def start_game(client, topic_list, msg_payload):
-    lobby_name = topic_list[1]
+def start_game(client, captures, msg_payload):
+    lobby_name, = captures
     if isinstance(msg_payload, bytes) and msg_payload.decode() == "START":
 
         if lobby_name in client.team_dict.keys():
+                client.lobbies.touch(lobby_name)
                 # create new game
-                dict_copy = copy.deepcopy(client.team_dict[lobby_name])
-                dict_copy.pop('started')
-
-                game = Game(dict_copy)
+                teams = {team_name: players for team_name, players in client.team_dict[lobby_name].items()
+                         if team_name != 'started'}
+                game = new_game(client, teams)
                 client.game_dict[lobby_name] = game
-                client.move_dict[lobby_name] = OrderedDict()
+                client.move_dict[lobby_name] = {}
                 client.team_dict[lobby_name]["started"] = True
+                mark_dirty(client, lobby_name)
+                start_turn_log(client, lobby_name, game)
+                print(f'Started game in {lobby_name} with seed {game.seed}')
 
-                for player in game.all_players.keys():
-                    client.publish(f'games/{lobby_name}/{player}/game_state', json.dumps(game.getGameData(player)))
-
+                publish_game_states(client, lobby_name, game)
+                client.outbox.flush()
+                schedule_turn(client, lobby_name)
 
-                print(game.map)
+                if VERBOSE:
+                    print(game.map)
     elif isinstance(msg_payload, bytes) and msg_payload.decode() == "STOP":
         publish_to_lobby(client, lobby_name, "Game Over: Game has been stopped")
-        client.team_dict.pop(lobby_name, None)
-        client.move_dict.pop(lobby_name, None)
-        client.game_dict.pop(lobby_name, None)
+        remove_lobby(client, lobby_name)
+
+
+# Places the players on a pre-generated board if the warm pool has one ready, else generates the board here
+def new_game(client, teams):
+    world = client.warm_pool.take(BOARD_HEIGHT, BOARD_WIDTH) if client.warm_pool is not None else None
+    if world is not None:
+        try:
+            game = Game.fromWorld(teams, world.height, world.width, world.codes, world.numCoins, world.seed)
+            client.metrics.count('warmpool.hit')
+            return game
+        except ValueError:
+            pass # More players than the board has free cells, Game raises the same error below
+    client.metrics.count('warmpool.miss')
+    return Game(teams, BOARD_WIDTH, BOARD_HEIGHT, compact=True)
+
+
+# Queues each player's view on the outbox, as a delta for players that asked for deltas when joining
+def publish_game_states(client, lobby_name, game):
+    with client.metrics.timer('turn.views'):
+        views = game.getAllGameData()
+    with client.metrics.timer('turn.serialize'):
+        for player, gameData in views.items():
+            message = game_state_message(client, lobby_name, player, gameData)
+            if message is not None:
+                topic, payload, options = message
+                client.outbox.publish(topic, payload, **options)
+
+
+# Encodes one player's view for the player's game_state topic
+# Returns (topic, payload, publish options), or None if the view hasn't changed since the last one sent
+def game_state_message(client, lobby_name, player, gameData):
+    payload = client.view_dict[lobby_name].encode(player, gameData)
+    if payload is None:
+        return None
+    kind = 'game_state_delta' if payload.get('keyframe') is False else 'game_state'
+    encoding = client.encoding_dict[lobby_name].get(player, codec.JSON)
+    return f'games/{lobby_name}/{player}/game_state', codec.encodeGameState(payload, encoding), delivery(kind)
+
+
+# Queues scores as JSON, plus a binary copy on scores/binary if any player negotiated it
+def publish_scores(client, lobby_name, game):
+    scores = game.getScores()
+    client.outbox.publish(f'games/{lobby_name}/scores', codec.encodeScores(scores), **delivery('scores'))
+    if codec.BINARY in client.encoding_dict[lobby_name].values():
+        client.outbox.publish(f'games/{lobby_name}/scores/binary', codec.encodeScores(scores, codec.BINARY),
+                              **delivery('scores'))
+
+
+def remove_lobby(client, lobby_name):
+    clear_retained(client, lobby_name)
+    client.team_dict.pop(lobby_name, None)
+    client.move_dict.pop(lobby_name, None)
+    client.game_dict.pop(lobby_name, None)
+    client.view_dict.pop(lobby_name, None)
+    client.encoding_dict.pop(lobby_name, None)
+    client.scheduler.cancel(lobby_name)
+    client.lobbies.remove(lobby_name)
+    if client.checkpoints is not None:
+        client.checkpoints.forget(lobby_name)
+    turn_log = client.turn_logs.pop(lobby_name, None)
+    if turn_log is not None:
+        client.turn_log_writer.write(turn_log)
+
+
+# An empty retained message deletes the one the broker holds, so finished lobbies don't resync new subscribers
+def clear_retained(client, lobby_name):
+    if not client.team_dict.get(lobby_name, {}).get('started'):
+        return
+    for player in client.game_dict[lobby_name].all_players:
+        client.publish(f'games/{lobby_name}/{player}/game_state', b'', qos=0, retain=True)
+    for topic in ('scores', 'scores/binary', PACKED_SUFFIX):
+        client.publish(f'games/{lobby_name}/{topic}', b'', qos=0, retain=True)
+    client.metrics.count('out.cleared', len(client.game_dict[lobby_name].all_players) + 3)
+
 
+def evict_lobby(client, lobby_name):
+    publish_to_lobby(client, lobby_name, "Game Over: Lobby was closed after inactivity")
+    remove_lobby(client, lobby_name)
 
-def publish_error_to_lobby(client, lobby_name, error):
-    publish_to_lobby(client, lobby_name, f"Error: {error}")
+
+# Scheduler callback: drops lobbies idle for longer than LOBBY_TTL, then runs again after EVICTION_INTERVAL
+def evict_idle_lobbies(client):
+    expired = client.lobbies.expire()
+    for lobby_name in expired:
+        evict_lobby(client, lobby_name)
+    if expired:
+        print(f"Evicted {len(expired)} idle lobbies: {client.lobbies.stats()}")
+    client.scheduler.schedule('$eviction', EVICTION_INTERVAL, lambda: evict_idle_lobbies(client))
+
+
+# Errors are JSON, e.g. {"error": "invalid_move", "message": "...", "field": "move", "player": "Player1"}
+def publish_error_to_lobby(client, lobby_name, error: InputError, player_name=None):
+    payload = error.toDict()
+    if player_name is not None:
+        payload['player'] = player_name
+    client.metrics.count(f'errors.{error.code}')
+    publish_to_lobby(client, lobby_name, json.dumps(payload))
 
 
 def publish_to_lobby(client, lobby_name, msg):
-    client.publish(f"games/{lobby_name}/lobby", msg)
+    client.publish(f"games/{lobby_name}/lobby", msg, **delivery('lobby'))
+    client.metrics.count('out.lobby')
+
+
+# Scheduler callback: reports the metrics of the last STATS_INTERVAL seconds, then starts a new interval
+def publish_stats(client):
+    stats = client.metrics.snapshot(reset=True)
+    stats['lobbies'] = client.lobbies.stats()
+    stats['games'] = len(client.game_dict)
+    # Average turns per second of a running game over the interval
+    stats['rates']['turnsPerGame'] = stats['rates'].get('turns', 0) / len(client.game_dict) if client.game_dict else 0.0
+    stats['time'] = time.time()
+    payload = json.dumps(stats)
+
+    client.publish(STATS_TOPIC, payload, **delivery('stats'))
+    if STATS_FILE:
+        with open(STATS_FILE, 'a') as stats_file:
+            stats_file.write(payload + '\n')
+    client.scheduler.schedule('$stats', STATS_INTERVAL, lambda: publish_stats(client))
 
 
+# Handlers receive the values of the '+' levels of their pattern, e.g. (lobby_name, player_name)
 dispatch = {
     'new_game' : add_player,
-    'move' : player_move,
-    'start' : start_game,
+    'games/+/+/move' : player_move,
+    'games/+/start' : start_game,
 }
 
+router = TopicRouter(dispatch)
 
-if __name__ == '__main__':
-    load_dotenv(dotenv_path='./credentials.env')
-    
-    broker_address = os.environ.get('BROKER_ADDRESS')
-    broker_port = int(os.environ.get('BROKER_PORT'))
-    username = os.environ.get('USER_NAME')
-    password = os.environ.get('PASSWORD')
+SUBSCRIPTIONS = tuple(dispatch)
 
-    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id="GameClient", userdata=None, protocol=paho.MQTTv5)
-    
-    # enable TLS for secure connection
-    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-    # set username and password
-    client.username_pw_set(username, password)
-    # connect to HiveMQ Cloud on port 8883 (default for MQTT)
-    client.connect(broker_address, broker_port)
+# Same shape as a paho message, so on_message can handle messages relayed from another thread or process
+ShardMessage = namedtuple('ShardMessage', ['topic', 'payload', 'qos'])
 
-    # setting callbacks, use separate functions like above for better visibility
-    client.on_subscribe = on_subscribe # Can comment out to not print when subscribing to new topics
-    client.on_message = on_message
-    client.on_publish = on_publish # Can comment out to not print when publishing to topics
-    
+
+def lobby_of(topic, payload):
+    """
+        Finds the lobby a message belongs to without running its handler
+        :return: the lobby name, or None if it can't be determined
+    """
+    route = router.match(topic)
+    if route is None:
+        return None
+    handler, captures = route
+    if handler is add_player:
+        # Only a name that could be a topic level, anything else would fail add_player's validation anyway
+        return lobbyNameOf(payload)
+    return captures[0]
+
+
+# Attaches the server's lobby state to a client, anything with a publish method can host it
+def init_server_state(client):
     # custom dictionary to track players
     client.team_dict = {} # Keeps tracks of players before a game starts {'lobby_name' : {'team_name' : [player_name, ...]}}
     client.game_dict = {} # Keeps track of the games {{'lobby_name' : Game Object}
-    client.move_dict = {} # Keeps track of the games {{'lobby_name' : Game Object}
+    client.move_dict = {} # Keeps track of the moves for the current turn {'lobby_name' : {'player_name' : Moveset}}
+    client.view_dict = {} # Keeps track of the last view sent to each player {'lobby_name' : ViewTracker}
+    client.encoding_dict = {} # Keeps track of the negotiated wire format {'lobby_name' : {'player_name' : 'json' | 'binary'}}
+    client.scheduler = TimerWheel(TICK_SECONDS) # Turn deadlines of every lobby
+    client.lobbies = LobbyRegistry(MAX_LOBBIES, LOBBY_TTL) # Activity of every resident lobby, see lobbies.stats()
+    client.metrics = Metrics() # Counters and latency histograms, reported by publish_stats
+    client.checkpoints = None # Checkpointer of the lobbies, see enable_checkpoints
+    client.turn_logs = {} # Keeps track of the turn log of every game {'lobby_name' : TurnLog}
+    client.turn_log_writer = TurnLogWriter() if TURN_LOG_DIR else None # Appends the turn logs to their files
+    client.warm_pool = None # Boards generated ahead of time for start_game, see create_server
+    client.turn_runner = resolve_turn # Resolves a lobby's turn once it is due, AsyncGameClient runs turns its own way
+    client.outbox = PublishBatch(client, PACK_UPDATES, client.metrics) # End-of-turn messages, sent together by outbox.flush()
+    client.scheduler.schedule('$eviction', EVICTION_INTERVAL, lambda: evict_idle_lobbies(client))
+    if STATS_INTERVAL > 0:
+        client.scheduler.schedule('$stats', STATS_INTERVAL, lambda: publish_stats(client))
+    if TURN_LOG_DIR:
+        client.scheduler.schedule('$turnlogs', TURN_LOG_FLUSH_INTERVAL, lambda: flush_turn_logs(client))
+
+
+def start_turn_log(client, lobby_name, game):
+    if TURN_LOG_DIR:
+        os.makedirs(TURN_LOG_DIR, exist_ok=True)
+        client.turn_logs[lobby_name] = TurnLog(logPath(TURN_LOG_DIR, lobby_name, time.time()), game, game.seed)
+
+
+# Scheduler callback: hands the buffered turns of every lobby to the writer thread, which appends them to the logs
+def flush_turn_logs(client):
+    for turn_log in client.turn_logs.values():
+        client.turn_log_writer.write(turn_log)
+    client.scheduler.schedule('$turnlogs', TURN_LOG_FLUSH_INTERVAL, lambda: flush_turn_logs(client))
+
+
+def close_turn_logs(client):
+    """
+        Writes out every buffered turn and waits for the writer thread, for shutdown
+    """
+    if client.turn_log_writer is not None:
+        for turn_log in client.turn_logs.values():
+            client.turn_log_writer.write(turn_log)
+        client.turn_log_writer.close()
+
+
+def mark_dirty(client, lobby_name):
+    if client.checkpoints is not None:
+        client.checkpoints.markDirty(lobby_name)
+
+
+# A lobby's checkpoint record: header length:I | JSON header | game snapshot once the game has started
+_HEADER_LENGTH = struct.Struct('>I')
+
+
+def dump_lobby(client, lobby_name):
+    if lobby_name not in client.team_dict:
+        return None
+    tracker = client.view_dict[lobby_name]
+    teams = client.team_dict[lobby_name]
+    header = json.dumps({
+        'teams': teams,
+        'encodings': client.encoding_dict[lobby_name],
+        'delta': [player for team, players in teams.items() if team != 'started'
+                  for player in players if tracker.isEnabled(player)],
+        'moves': {player: move.name for player, move in client.move_dict.get(lobby_name, {}).items()},
+        'seed': client.game_dict[lobby_name].seed if lobby_name in client.game_dict else None,
+    }).encode()
+    game = client.game_dict.get(lobby_name)
+    return b''.join((_HEADER_LENGTH.pack(len(header)), header, b'' if game is None else snapshot.dumpGame(game)))
+
+
+def restore_lobby(client, lobby_name, record):
+    """
+        :return: False if the lobby was left out because the server is full
+    """
+    # Restored lobbies count against MAX_LOBBIES like new ones, or they would never expire
+    admitted, evicted = client.lobbies.admit(lobby_name)
+    if evicted is not None:
+        evict_lobby(client, evicted)
+    if not admitted:
+        return False
+
+    length, = _HEADER_LENGTH.unpack_from(record, 0)
+    header = json.loads(record[_HEADER_LENGTH.size:_HEADER_LENGTH.size + length])
+    client.team_dict[lobby_name] = header['teams']
+    client.encoding_dict[lobby_name] = header['encodings']
+    # Trackers start over, so every player's first view after a restart is a keyframe
+    client.view_dict[lobby_name] = ViewTracker()
+    for player in header['delta']:
+        client.view_dict[lobby_name].enable(player)
+
+    if header['teams']['started']:
+        client.game_dict[lobby_name] = snapshot.loadGame(record[_HEADER_LENGTH.size + length:], header['seed'])
+        client.move_dict[lobby_name] = {player: Moveset[move] for player, move in header['moves'].items()}
+        start_turn_log(client, lobby_name, client.game_dict[lobby_name])
+        schedule_turn(client, lobby_name)
+    return True
+
+
+def enable_checkpoints(client, path=CHECKPOINT_FILE, interval=CHECKPOINT_INTERVAL):
+    """
+        Restores the lobbies of the last checkpoint, then checkpoints every interval seconds in the background
+    """
+    records = readCheckpoint(path)
+    for lobby_name, record in records.items():
+        try:
+            if not restore_lobby(client, lobby_name, record):
+                print(f"Could not restore lobby {lobby_name}, the server is full")
+        except Exception:
+            print(f"Could not restore lobby {lobby_name}")
+            traceback.print_exc()
+    if records:
+        print(f"Restored {len(client.team_dict)} lobbies from {path}")
+    client.checkpoints = Checkpointer(path, {name: records[name] for name in client.team_dict})
+    client.scheduler.schedule('$checkpoint', interval, lambda: checkpoint_lobbies(client, interval))
+
+
+# Scheduler callback: serializes the lobbies that changed, the file is written by the checkpointer's thread
+def checkpoint_lobbies(client, interval):
+    with client.metrics.timer('checkpoint'):
+        client.checkpoints.checkpoint(lambda lobby_name: dump_lobby(client, lobby_name))
+    client.scheduler.schedule('$checkpoint', interval, lambda: checkpoint_lobbies(client, interval))
 
-    client.subscribe("new_game")
-    client.subscribe('games/+/start')
-    client.subscribe('games/+/+/move')
 
-    client.loop_forever()
+def create_server(client_id="GameClient", broker=None):
+    """
+        Creates a connected server client on the configured transport, see transport.create_client
+        :param broker: a transport.LoopbackBroker to serve in-process instead
+    """
+    client = transport.create_client(client_id, broker=broker)
+    transport.connect(client)
+
+    # setting callbacks, use separate functions like above for better visibility
+    client.on_subscribe = on_subscribe # Can comment out to not print when subscribing to new topics
+    client.on_message = on_message
+    if VERBOSE:
+        client.on_publish = on_publish # Only print when publishing to topics in verbose mode
+
+    init_server_state(client)
+    if CHECKPOINT_FILE and CHECKPOINT_INTERVAL > 0:
+        enable_checkpoints(client)
+    if WARM_POOL_WORKERS > 0:
+        client.warm_pool = WarmPool([(BOARD_HEIGHT, BOARD_WIDTH)], WARM_POOL_DEPTH, WARM_POOL_WORKERS)
+
+    for topic in SUBSCRIPTIONS:
+        client.subscribe(topic)
+    return client
+
+
+def reconnect(client):
+    """
+        Reconnects to the broker and subscribes again, the broker may not have kept the session
+        :return: whether the connection was reestablished
+    """
+    client.metrics.count('reconnects')
+    try:
+        client.reconnect()
+    except OSError as error:
+        print(f'Reconnecting to the broker failed: {error}')
+        return False
+    print('Reconnected to the broker')
+    for topic in SUBSCRIPTIONS:
+        client.subscribe(topic)
+    return True
+
+
+def serve(client, stop_event=None):
+    """
+        Runs the server until stop_event is set, or forever without one
+    """
+    # Network and turn deadlines share this thread, so handlers never run concurrently
+    reconnect_delay = RECONNECT_MIN_DELAY
+    next_reconnect = 0.0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if client.loop(timeout=TICK_SECONDS) != 0: # MQTT_ERR_SUCCESS
+                # Unlike loop_forever, loop doesn't reconnect and returns at once while disconnected
+                now = time.monotonic()
+                if now < next_reconnect:
+                    time.sleep(min(TICK_SECONDS, next_reconnect - now))
+                elif reconnect(client):
+                    reconnect_delay = RECONNECT_MIN_DELAY
+                else:
+                    next_reconnect = now + reconnect_delay
+                    reconnect_delay = min(reconnect_delay * 2, RECONNECT_MAX_DELAY)
+            client.scheduler.advance()
+    finally:
+        close_turn_logs(client)
+        # Save every in-progress game on the way out, so a restart resumes them
+        if client.checkpoints is not None:
+            client.checkpoints.checkpoint(lambda lobby_name: dump_lobby(client, lobby_name))
+            client.checkpoints.close()
+        if client.warm_pool is not None:
+            client.warm_pool.close()
+
+
+if __name__ == '__main__':
+    # Exit through serve's finally on SIGTERM too, e.g. when a deploy stops the process
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    transport.require_remote_broker()
+    serve(create_server())
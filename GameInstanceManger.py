@@ -1,64 +1,120 @@
 import os
-import json
+import sys
+import zlib
+import queue
+import signal
+import threading
+import multiprocessing
 
-import paho.mqtt.client as paho
-from paho import mqtt
-from dotenv import load_dotenv
-from pydantic import ValidationError
+import GameClient
+import transport
+from GameClient import ShardMessage, lobby_of
 
-from InputTypes import NewPlayer, Move
-from game import Game
 
+class ShardClient():
+    def __init__(self, outbox: multiprocessing.Queue):
+        """
+        Stands in for the paho client inside a worker process, publishes are sent back to the front-end
+        """
+        # Not self.outbox, init_server_state uses that name for the end-of-turn PublishBatch
+        self.publishes = outbox
+        GameClient.init_server_state(self)
 
-# Global Variables
-load_dotenv(dotenv_path='./credentials.env')
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.publishes.put((topic, payload, qos, retain))
 
-broker_address = os.environ.get('BROKER_ADDRESS')
-broker_port = int(os.environ.get('BROKER_PORT'))
-username = os.environ.get('USERNAME')
-password = os.environ.get('PASSWORD')
 
-
-def on_message(self, client, userdata, msg):
-        """
-        Prints a mqtt message to stdout ( used as callback for subscribe )
-        :param client: the client itself
-        :param userdata: userdata is set when initiating the client, here it is userdata=None
-        :param msg: the message with topic and payload
-        """
-        pass
+def run_worker(inbox: multiprocessing.Queue, outbox: multiprocessing.Queue):
+    """
+    Worker process: owns the Game instances of every lobby hashed to it and handles their messages in order
+    """
+    # Ctrl+C reaches the whole process group, the front-end stops the workers through their inboxes instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    client = ShardClient(outbox)
+    try:
+        while True:
+            try:
+                item = inbox.get(timeout=GameClient.TICK_SECONDS)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                topic, payload = item
+                GameClient.on_message(client, None, ShardMessage(topic, payload, 0))
+            client.scheduler.advance()
+    finally:
+        # The buffered turns would be lost with the process
+        GameClient.close_turn_logs(client)
 
 
 class GameInstanceManager():
-    def __init__(self, lobby_name: str, team_dict: dict[str,list[str]]):
+    def __init__(self, num_workers: int = os.cpu_count() or 1):
         """
-        Creates a new client to handle each game
+        Front-end of the sharded server: hashes each lobby_name to one of num_workers processes and
+        routes new_game, start and move messages to it
         """
+        self.num_workers = num_workers
+        # Spawned rather than forked, so workers don't inherit the broker connection opened below
+        context = multiprocessing.get_context('spawn')
+        self.inboxes = [context.Queue() for _ in range(num_workers)]
+        self.outbox = context.Queue()
+        self.workers = [context.Process(target=run_worker, args=(inbox, self.outbox), daemon=True)
+                        for inbox in self.inboxes]
+        self.publisher = threading.Thread(target=self.forward_publishes, daemon=True)
+
         # initialize new client
-        self.client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id=lobby_name, userdata=None, protocol=paho.MQTTv5)
-        # enable TLS for secure connection
-        self.client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-        # set username and password
-        self.client.username_pw_set(username, password)
-        # connect to HiveMQ Cloud on port 8883 (default for MQTT)
-        self.client.connect(broker_address, broker_port)
+        self.client = transport.create_client("GameInstanceManager")
+        transport.connect(self.client)
         # handles subscription
         self.client.on_message = self.on_message
 
-        # subscribes to player movement topics
-        for team in team_dict.keys():
-             for player in team_dict[team]:  
-                self.client.subscribe(f"games/{lobby_name}/{player}/move")
+        for topic in GameClient.SUBSCRIPTIONS:
+            self.client.subscribe(topic)
+
+    def shard_for(self, lobby_name: str) -> int:
+        # crc32 rather than hash() so every process agrees on the shard
+        return zlib.crc32(lobby_name.encode()) % self.num_workers
+
+    def on_message(self, client, userdata, msg):
+        """
+        Routes a message to the worker that owns its lobby
+        :param client: the client itself
+        :param userdata: userdata is set when initiating the client, here it is userdata=None
+        :param msg: the message with topic and payload
+        """
+        lobby_name = lobby_of(msg.topic, msg.payload)
+        # Messages without a lobby still go to a worker so it can report the validation error
+        shard = 0 if lobby_name is None else self.shard_for(lobby_name)
+        self.inboxes[shard].put((msg.topic, msg.payload))
+
+    def forward_publishes(self):
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                break
+            topic, payload, qos, retain = item
+            self.client.publish(topic, payload, qos=qos, retain=retain)
 
     def start(self):
-        self.client.loop_start()
+        for worker in self.workers:
+            worker.start()
+        self.publisher.start()
+        self.client.loop_forever()
 
-    def __del__(self):
-        self.client.loop_stop()
+    def stop(self):
         self.client.disconnect()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.outbox.put(None)
 
 
-    
-
 if __name__ == "__main__":
-    game = GameInstanceManager()
+    transport.require_remote_broker()
+    manager = GameInstanceManager(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1)
+    try:
+        manager.start()
+    except KeyboardInterrupt:
+        manager.stop()
@@ -1,12 +1,17 @@
 from pydantic import BaseModel, constr
 
+# Names become topic levels, so they can't contain MQTT separators or wildcards
+TOPIC_LEVEL = r'^[^/+#]+$'
+
 class NewPlayer(BaseModel):
-    lobby_name: constr(min_length=1, max_length=20)
+    lobby_name: constr(min_length=1, max_length=20, pattern=TOPIC_LEVEL)
     team_name: constr(min_length=1, max_length=20)
-    player_name: constr(min_length=1, max_length=20)
+    player_name: constr(min_length=1, max_length=20, pattern=TOPIC_LEVEL)
+    delta: bool = False # Receive game_state as deltas against the last view instead of full views
+    encoding: constr(pattern=r'^(json|binary)$') = 'json' # Wire format for game_state and scores/binary, see codec.py
 
 class Move(BaseModel):
-    move: constr(regex=r'^(UP|DOWN|LEFT|RIGHT)$')
+    move: constr(pattern=r'^(UP|DOWN|LEFT|RIGHT)$')
 
 class Start(BaseModel):
-    start: constr(regex=r'^(START)$')
+    start: constr(pattern=r'^(START)$')
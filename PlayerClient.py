@@ -1,11 +1,10 @@
-import os
 import json
-from dotenv import load_dotenv
-
-import paho.mqtt.client as paho
-from paho import mqtt
 import time
 
+import codec
+import transport
+from publisher import delivery
+
 
 # setting callbacks for different events to see if it works, print the message etc.
 def on_connect(client, userdata, flags, rc, properties=None):
@@ -20,7 +19,8 @@ def on_connect(client, userdata, flags, rc, properties=None):
     print("CONNACK received with code %s." % rc)
     client.subscribe(f"games/{lobby_name}/lobby")
     client.subscribe(f"games/{lobby_name}/{player_name}/game_state")
-    client.subscribe(f"games/{lobby_name}/scores")
+    client.subscribe(f"games/{lobby_name}/scores" if encoding == codec.JSON else f"games/{lobby_name}/scores/binary")
+    client.subscribe(f"games/{lobby_name}/updates")
 
 
 # with this callback you can see if your publish was successful
@@ -57,25 +57,30 @@ def on_message(client, userdata, msg):
         :param msg: the message with topic and payload
     """
 
-    print("message: " + msg.topic + " " + str(msg.qos) + " " + str(msg.payload))
+    # Servers running with PACK_UPDATES send every end-of-turn message of the lobby as one bundle
+    if msg.topic.endswith("/updates"):
+        for name, payload in codec.decodeBundle(msg.payload).items():
+            if name in (f"{player_name}/game_state", "scores", "scores/binary"):
+                print_message(f"games/{lobby_name}/{name}", msg.qos, payload)
+    else:
+        print_message(msg.topic, msg.qos, msg.payload)
+
+
+def print_message(topic, qos, payload):
+    # The server clears retained game state with an empty payload when a lobby closes
+    if not payload:
+        return
+    if topic.endswith("/game_state"):
+        payload = codec.decodeGameState(payload)
+    elif topic.endswith("/scores") or topic.endswith("/scores/binary"):
+        payload = codec.decodeScores(payload)
+    print("message: " + topic + " " + str(qos) + " " + str(payload))
 
 
 if __name__ == '__main__':
-    load_dotenv(dotenv_path='./credentials.env')
-    
-    broker_address = os.environ.get('BROKER_ADDRESS')
-    broker_port = int(os.environ.get('BROKER_PORT'))
-    username = os.environ.get('USER_NAME')
-    password = os.environ.get('PASSWORD')
-
-    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id="Player1", userdata=None, protocol=paho.MQTTv5)
-    
-    # enable TLS for secure connection
-    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-    # set username and password
-    client.username_pw_set(username, password)
-    # connect to HiveMQ Cloud on port 8883 (default for MQTT)
-    
+    transport.require_remote_broker()
+    client = transport.create_client("Player1")
+
 # Assign the callback functions
 client.on_connect = on_connect
 client.on_message = on_message
@@ -83,7 +88,7 @@ client.on_publish = on_publish
 client.on_subscribe = on_subscribe
 
 # Connect to the MQTT broker
-client.connect(broker_address, broker_port)
+transport.connect(client)
 
 # Start the loop to process received messages
 client.loop_start()
@@ -91,26 +96,28 @@ client.loop_start()
 # Game setup variables
 lobby_name = "TestLobby"  # This should be unique to your session
 player_name = "Player1"  # This should be unique to your player
+encoding = codec.JSON  # Wire format for game_state and scores, codec.JSON or codec.BINARY
 
 # Publish the new game command to join the lobby
 client.publish("new_game", json.dumps({
     'lobby_name': lobby_name,
     'team_name': 'ATeam',
-    'player_name': player_name
-}), qos=1)
+    'player_name': player_name,
+    'encoding': encoding
+}), **delivery('control'))
 
 # Wait a second for the new game command to be processed by the server
 time.sleep(1)
 
 # Publish a start command to begin the game
-client.publish(f"games/{lobby_name}/start", "START", qos=1)
+client.publish(f"games/{lobby_name}/start", "START", **delivery('control'))
 
 # Allow the player to make moves based on user input
 try:
     while True:
         move_command = input("Enter your move (UP, DOWN, LEFT, RIGHT, or EXIT to quit): ").upper()
         if move_command in ["UP", "DOWN", "LEFT", "RIGHT"]:
-            client.publish(f"games/{lobby_name}/{player_name}/move", move_command, qos=1)
+            client.publish(f"games/{lobby_name}/{player_name}/move", move_command, **delivery('control'))
         elif move_command == "EXIT":
             print("Exiting game.")
             break
@@ -0,0 +1,209 @@
+"""
+Micro-benchmarks for the game engine.
+
+Every case is set up and timed from a fixed seed, so two runs on the same
+machine do the same work. For each case the runner reports operations per
+second (best of several repeats) and the memory a batch of operations
+allocates according to tracemalloc: the peak above the starting point and
+what stays allocated afterwards, per operation.
+
+    python benchmark.py                          # run everything
+    python benchmark.py -k resolveTurn           # only cases containing the text
+    python benchmark.py --save                   # store the results as the baseline
+    python benchmark.py --compare                # fail if a case is slower than the baseline
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from itertools import cycle
+
+import layouts
+from game import Game
+from map import Map
+from moveset import Moveset
+from player import Player
+from team import Team
+
+SEED = 140
+BASELINE_PATH = 'bench_baseline.json'
+MOVES = list(Moveset)
+
+
+def make_teams(num_players: int, num_teams: int = 2) -> dict[str, list[str]]:
+    teams = {f'Team{t}': [] for t in range(num_teams)}
+    for i in range(num_players):
+        teams[f'Team{i % num_teams}'].append(f'Player{i}')
+    return teams
+
+
+def make_game(num_players: int, size: int, compact: bool = True) -> Game:
+    return Game(make_teams(num_players), width=size, height=size, compact=compact, wallSeed=SEED, seed=SEED)
+
+
+# Each case returns the operation to time, built from the seeded global random state
+def bench_map(size: int, compact: bool):
+    team = Team('TeamA')
+    players = [Player(f'Player{i}', team) for i in range(4)]
+    walls = layouts.generate('classic', size, size)
+    rng = random.Random(SEED)
+    return lambda: Map(size, size, players, walls, compact=compact, rng=rng)
+
+
+def bench_move_player():
+    game = make_game(4, 32)
+    moves = cycle([(name, random.choice(MOVES)) for name in game.all_players for _ in range(256)])
+    return lambda: game.movePlayer(*next(moves))
+
+
+def bench_game_data(vision_radius: int):
+    game = make_game(4, 32)
+    names = cycle(game.all_players)
+    return lambda: game.getGameData(next(names), vision_radius)
+
+
+def bench_all_game_data(num_players: int):
+    game = make_game(num_players, 32)
+    return lambda: game.getAllGameData()
+
+
+def bench_scores():
+    game = make_game(4, 32)
+    return game.getScores
+
+
+def bench_resolve_turn(num_players: int):
+    game = make_game(num_players, 64)
+    turns = cycle([{name: random.choice(MOVES) for name in game.all_players} for _ in range(64)])
+    return lambda: game.resolveTurn(next(turns))
+
+
+CASES = {
+    'Map(10x10)': lambda: bench_map(10, False),
+    'Map(10x10, compact)': lambda: bench_map(10, True),
+    'Map(32x32)': lambda: bench_map(32, False),
+    'Map(32x32, compact)': lambda: bench_map(32, True),
+    'Map(100x100)': lambda: bench_map(100, False),
+    'Map(100x100, compact)': lambda: bench_map(100, True),
+    'Game.movePlayer': bench_move_player,
+    'Game.getGameData(r=1)': lambda: bench_game_data(1),
+    'Game.getGameData(r=2)': lambda: bench_game_data(2),
+    'Game.getGameData(r=4)': lambda: bench_game_data(4),
+    'Game.getGameData(r=8)': lambda: bench_game_data(8),
+    'Game.getAllGameData(4 players)': lambda: bench_all_game_data(4),
+    'Game.getAllGameData(32 players)': lambda: bench_all_game_data(32),
+    'Game.getScores': bench_scores,
+    'Game.resolveTurn(4 players)': lambda: bench_resolve_turn(4),
+    'Game.resolveTurn(16 players)': lambda: bench_resolve_turn(16),
+    'Game.resolveTurn(64 players)': lambda: bench_resolve_turn(64),
+}
+
+
+def time_batch(op, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        op()
+    return time.perf_counter() - start
+
+
+def run_case(make_op, min_time: float, repeats: int) -> dict:
+    random.seed(SEED)
+    op = make_op()
+
+    # Grow the batch until it takes min_time, which also warms up caches
+    count = 1
+    while time_batch(op, count) < min_time:
+        count *= 2
+    best = min(time_batch(op, count) for _ in range(repeats))
+
+    # Separate pass so tracing doesn't slow the timed runs
+    tracemalloc.start()
+    op()
+    tracemalloc.clear_traces()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    batch = min(count, 1000)
+    for _ in range(batch):
+        op()
+    end, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'opsPerSec': count / best,
+            'usPerOp': best / count * 1e6,
+            'peakBytes': peak - start,
+            'retainedBytesPerOp': (end - start) / batch}
+
+
+def run(selected: dict, min_time: float, repeats: int) -> dict:
+    results = {}
+    print(f"{'case':34} {'ops/sec':>12} {'us/op':>10} {'peak KiB':>10} {'retained B/op':>14}")
+    for name, make_op in selected.items():
+        result = results[name] = run_case(make_op, min_time, repeats)
+        print(f"{name:34} {result['opsPerSec']:12.1f} {result['usPerOp']:10.2f} "
+              f"{result['peakBytes'] / 1024:10.1f} {result['retainedBytesPerOp']:14.1f}")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Prints each case's speed relative to the baseline
+    :param threshold: Fraction of the baseline's ops/sec a case may lose before it counts as a regression
+    :return: Names of the regressed cases
+    """
+    regressions = []
+    print(f"\n{'case':34} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:34} {'-':>12} {result['opsPerSec']:12.1f} {'new':>8}")
+            continue
+        change = result['opsPerSec'] / before['opsPerSec'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:34} {before['opsPerSec']:12.1f} {result['opsPerSec']:12.1f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Engine micro-benchmarks with a stored baseline")
+    parser.add_argument('-k', dest='keyword', default='', help="only run cases whose name contains this text")
+    parser.add_argument('--min-time', type=float, default=0.1, help="seconds each timed batch runs for")
+    parser.add_argument('--repeats', type=int, default=5, help="timed batches per case, the fastest counts")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file")
+    parser.add_argument('--save', action='store_true', help="store the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="compare with the baseline and exit 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=0.15, help="slowdown that counts as a regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    selected = {name: case for name, case in CASES.items() if args.keyword in name}
+    results = run(selected, args.min_time, args.repeats)
+
+    if args.compare:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+    if args.save:
+        # Merge so saving a filtered run keeps the other cases
+        try:
+            with open(args.baseline) as baseline_file:
+                stored = json.load(baseline_file)['results']
+        except FileNotFoundError:
+            stored = {}
+        stored.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'seed': SEED,
+                       'results': stored}, baseline_file, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
@@ -0,0 +1,139 @@
+"""
+Periodic checkpoints of the server's lobbies.
+
+The server serializes lobbies on its own thread, so it never reads a game
+while a handler changes it. Only lobbies marked dirty since the last
+checkpoint are serialized again, and the others reuse their cached
+records. Writing the file happens on a background thread: the latest
+checkpoint goes to a temporary file, is fsynced and then renamed over the
+previous one, so a crash leaves either the old file or the new one.
+
+File layout, big-endian: 'GCKP' | version:B | count:I | (name length:H, name, record length:I, record)*
+"""
+
+import os
+import struct
+import threading
+from typing import Callable, Optional
+
+MAGIC = b'GCKP'
+VERSION = 1
+
+_HEADER = struct.Struct('>4sBI')
+_NAME = struct.Struct('>H')
+_LENGTH = struct.Struct('>I')
+
+
+def encodeCheckpoint(records: dict[str, bytes]) -> bytes:
+    parts = [_HEADER.pack(MAGIC, VERSION, len(records))]
+    for name, record in records.items():
+        encoded = name.encode()
+        parts += [_NAME.pack(len(encoded)), encoded, _LENGTH.pack(len(record)), record]
+    return b''.join(parts)
+
+
+def decodeCheckpoint(data: bytes) -> dict[str, bytes]:
+    magic, version, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a version {VERSION} checkpoint')
+    offset = _HEADER.size
+    records = {}
+    for _ in range(count):
+        length, = _NAME.unpack_from(data, offset)
+        offset += _NAME.size
+        name = data[offset:offset + length].decode()
+        offset += length
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        records[name] = data[offset:offset + length]
+        offset += length
+    return records
+
+
+def readCheckpoint(path: str) -> dict[str, bytes]:
+    """
+    :return: {lobbyName: record}, empty if there is no checkpoint yet
+    """
+    try:
+        with open(path, 'rb') as checkpointFile:
+            return decodeCheckpoint(checkpointFile.read())
+    except FileNotFoundError:
+        return {}
+
+
+class Checkpointer:
+    def __init__(self, path: str, records: Optional[dict[str, bytes]] = None):
+        """
+        :param path: Checkpoint file, replaced atomically on every write
+        :param records: Records already on disk, e.g. from readCheckpoint, so restored lobbies aren't serialized again
+        """
+        self.path = path
+        self.__records: dict[str, bytes] = dict(records or {})
+        self.__dirty: set[str] = set()
+        self.__removed = False
+        self.__pending: Optional[bytes] = None
+        self.__closed = False
+        self.__wakeup = threading.Condition()
+        self.__writer = threading.Thread(target=self.__run, daemon=True)
+        self.__writer.start()
+        self.written = 0
+
+    def markDirty(self, name: str):
+        self.__dirty.add(name)
+
+    def forget(self, name: str):
+        self.__dirty.discard(name)
+        if self.__records.pop(name, None) is not None:
+            self.__removed = True
+
+    def checkpoint(self, serialize: Callable[[str], Optional[bytes]]) -> int:
+        """
+        Serializes the dirty lobbies on the calling thread and queues the file for the writer thread
+        :param serialize: Returns a lobby's record, or None if the lobby no longer exists
+        :return: Number of lobbies serialized
+        """
+        if not self.__dirty and not self.__removed:
+            return 0
+        dirty, self.__dirty = self.__dirty, set()
+        for name in dirty:
+            record = serialize(name)
+            if record is None:
+                self.__records.pop(name, None)
+            else:
+                self.__records[name] = record
+        self.__removed = False
+
+        data = encodeCheckpoint(self.__records)
+        with self.__wakeup:
+            # An unwritten older checkpoint is superseded
+            self.__pending = data
+            self.__wakeup.notify()
+        return len(dirty)
+
+    def close(self):
+        """
+        Waits for the last queued checkpoint to reach the disk
+        """
+        with self.__wakeup:
+            self.__closed = True
+            self.__wakeup.notify()
+        self.__writer.join()
+
+    def __run(self):
+        while True:
+            with self.__wakeup:
+                while self.__pending is None and not self.__closed:
+                    self.__wakeup.wait()
+                data, self.__pending = self.__pending, None
+                if data is None:
+                    return
+            self.__write(data)
+
+    def __write(self, data: bytes):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'wb') as checkpointFile:
+            checkpointFile.write(data)
+            checkpointFile.flush()
+            os.fsync(checkpointFile.fileno())
+        os.replace(temporary, self.path)
+        self.written += 1
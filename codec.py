@@ -0,0 +1,235 @@
+"""
+Wire formats for game_state and scores payloads, shared by the server and the clients.
+
+JSON is the default. The binary format is struct-packed, big-endian:
+
+    view:     0x01 | x:H y:H | teammates | enemyPositions | coin1 | coin2 | coin3 | walls
+    keyframe: 0x02 | seq:I | view without its kind byte
+    delta:    0x03 | seq:I | x:H y:H | added entities | removed entities
+    scores:   0x04 | count:H | (name, score:i)*
+    bundle:   0x05 | count:H | (length:I payload)* | count:H | (name, payload index:H)*
+
+A position list is count:H followed by (x:H y:H)*, teammates are count:H
+followed by (name, x:H, y:H)* and a name is length:B followed by UTF-8.
+Binary payloads never start with '{', so decode* accepts both formats.
+A bundle packs several messages of one lobby, storing identical payloads once.
+"""
+
+import json
+import struct
+from typing import Union
+
+from deltas import POSITION_KEYS
+
+JSON = 'json'
+BINARY = 'binary'
+ENCODINGS = (JSON, BINARY)
+
+VIEW = 1
+KEYFRAME = 2
+DELTA = 3
+SCORES = 4
+BUNDLE = 5
+
+_KIND = struct.Struct('>B')
+_COUNT = struct.Struct('>H')
+_SEQ = struct.Struct('>I')
+_LOC = struct.Struct('>HH')
+_SCORE = struct.Struct('>i')
+_LENGTH = struct.Struct('>I')
+
+
+def encodeGameState(payload: dict, encoding: str = JSON) -> Union[str, bytes]:
+    """
+    :param payload: A gameData dict or a ViewTracker keyframe/delta message
+    """
+    if encoding == JSON:
+        return json.dumps(payload)
+    if encoding != BINARY:
+        raise ValueError(f'{encoding} is not a valid encoding')
+
+    out = bytearray()
+    if 'seq' not in payload:
+        out += _KIND.pack(VIEW)
+        _packView(out, payload)
+    elif payload['keyframe']:
+        out += _KIND.pack(KEYFRAME) + _SEQ.pack(payload['seq'])
+        _packView(out, payload['state'])
+    else:
+        out += _KIND.pack(DELTA) + _SEQ.pack(payload['seq']) + _LOC.pack(*payload['currentPosition'])
+        for section in (payload['added'], payload['removed']):
+            _packTeammates(out, section.get('teammates', ()))
+            for key in POSITION_KEYS:
+                _packLocs(out, section.get(key, ()))
+    return bytes(out)
+
+
+def decodeGameState(data: Union[str, bytes]) -> dict:
+    if not data or data[:1] in (b'{', '{'):
+        return json.loads(data)
+
+    kind, = _KIND.unpack_from(data, 0)
+    if kind == VIEW:
+        return _unpackView(data, 1)[0]
+    if kind == KEYFRAME:
+        seq, = _SEQ.unpack_from(data, 1)
+        return {'seq': seq, 'keyframe': True, 'state': _unpackView(data, 5)[0]}
+    if kind == DELTA:
+        seq, = _SEQ.unpack_from(data, 1)
+        x, y = _LOC.unpack_from(data, 5)
+        offset = 9
+        sections = []
+        for _ in range(2):
+            section = {}
+            teammates, offset = _unpackTeammates(data, offset)
+            if teammates:
+                section['teammates'] = teammates
+            for key in POSITION_KEYS:
+                locs, offset = _unpackLocs(data, offset)
+                if locs:
+                    section[key] = locs
+            sections.append(section)
+        return {'seq': seq, 'keyframe': False, 'currentPosition': (x, y),
+                'added': sections[0], 'removed': sections[1]}
+    raise ValueError(f'Unknown game_state payload kind {kind}')
+
+
+def encodeScores(scores: dict[str, int], encoding: str = JSON) -> Union[str, bytes]:
+    if encoding == JSON:
+        return json.dumps(scores)
+    if encoding != BINARY:
+        raise ValueError(f'{encoding} is not a valid encoding')
+
+    out = bytearray(_KIND.pack(SCORES) + _COUNT.pack(len(scores)))
+    for teamName, score in scores.items():
+        _packName(out, teamName)
+        out += _SCORE.pack(score)
+    return bytes(out)
+
+
+def decodeScores(data: Union[str, bytes]) -> dict[str, int]:
+    if not data or data[:1] in (b'{', '{'):
+        return json.loads(data)
+
+    kind, = _KIND.unpack_from(data, 0)
+    if kind != SCORES:
+        raise ValueError(f'Unknown scores payload kind {kind}')
+    count, = _COUNT.unpack_from(data, 1)
+    offset = 3
+    scores = {}
+    for _ in range(count):
+        teamName, offset = _unpackName(data, offset)
+        scores[teamName], = _SCORE.unpack_from(data, offset)
+        offset += _SCORE.size
+    return scores
+
+
+def encodeBundle(messages: dict[str, Union[str, bytes]]) -> bytes:
+    """
+    :param messages: {name: payload, ...}, e.g. {'Player1/game_state': ..., 'scores': ...}
+    """
+    payloads: dict[bytes, int] = {}
+    entries = []
+    for name, payload in messages.items():
+        payload = payload.encode() if isinstance(payload, str) else bytes(payload)
+        entries.append((name, payloads.setdefault(payload, len(payloads))))
+
+    out = bytearray(_KIND.pack(BUNDLE) + _COUNT.pack(len(payloads)))
+    for payload in payloads:
+        out += _LENGTH.pack(len(payload)) + payload
+    out += _COUNT.pack(len(entries))
+    for name, index in entries:
+        _packName(out, name)
+        out += _COUNT.pack(index)
+    return bytes(out)
+
+
+def decodeBundle(data: bytes) -> dict[str, bytes]:
+    """
+    :return: {name: payload, ...}, each payload still encoded as published on its own topic
+    """
+    kind, = _KIND.unpack_from(data, 0)
+    if kind != BUNDLE:
+        raise ValueError(f'Unknown bundle payload kind {kind}')
+    count, = _COUNT.unpack_from(data, 1)
+    offset = 3
+    payloads = []
+    for _ in range(count):
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        payloads.append(bytes(data[offset:offset+length]))
+        offset += length
+    count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    messages = {}
+    for _ in range(count):
+        name, offset = _unpackName(data, offset)
+        index, = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        messages[name] = payloads[index]
+    return messages
+
+
+def _packName(out: bytearray, name: str):
+    encoded = name.encode()
+    out += _KIND.pack(len(encoded)) + encoded
+
+
+def _unpackName(data: bytes, offset: int) -> tuple[str, int]:
+    length = data[offset]
+    return bytes(data[offset+1:offset+1+length]).decode(), offset+1+length
+
+
+def _packLocs(out: bytearray, locs):
+    out += _COUNT.pack(len(locs))
+    for x, y in locs:
+        out += _LOC.pack(x, y)
+
+
+def _unpackLocs(data: bytes, offset: int) -> tuple[list[tuple[int, int]], int]:
+    count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    locs = [_LOC.unpack_from(data, offset + i*_LOC.size) for i in range(count)]
+    return locs, offset + count*_LOC.size
+
+
+def _packTeammates(out: bytearray, teammates):
+    out += _COUNT.pack(len(teammates))
+    for name, (x, y) in teammates:
+        _packName(out, name)
+        out += _LOC.pack(x, y)
+
+
+def _unpackTeammates(data: bytes, offset: int) -> tuple[list[tuple[str, tuple[int, int]]], int]:
+    count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    teammates = []
+    for _ in range(count):
+        name, offset = _unpackName(data, offset)
+        teammates.append((name, _LOC.unpack_from(data, offset)))
+        offset += _LOC.size
+    return teammates, offset
+
+
+def _packView(out: bytearray, gameData: dict):
+    out += _LOC.pack(*gameData['currentPosition'])
+    _packTeammates(out, list(zip(gameData['teammateNames'], gameData['teammatePositions'])))
+    for key in POSITION_KEYS:
+        _packLocs(out, gameData[key])
+
+
+def _unpackView(data: bytes, offset: int) -> tuple[dict, int]:
+    currentPosition = _LOC.unpack_from(data, offset)
+    teammates, offset = _unpackTeammates(data, offset + _LOC.size)
+    locs = {}
+    for key in POSITION_KEYS:
+        locs[key], offset = _unpackLocs(data, offset)
+    gameData = {'teammateNames': [name for name, _ in teammates],
+                'teammatePositions': [loc for _, loc in teammates],
+                'enemyPositions': locs['enemyPositions'],
+                'currentPosition': currentPosition,
+                'coin1': locs['coin1'],
+                'coin2': locs['coin2'],
+                'coin3': locs['coin3'],
+                'walls': locs['walls']}
+    return gameData, offset
@@ -0,0 +1,122 @@
+"""
+Delta encoding for game_state messages.
+
+The server keeps the last view sent to each player and publishes only the
+entities that were added or removed since, with a full keyframe every
+keyframeInterval turns. Every message carries a sequence number so a
+client that sees a gap can drop its state and wait for the next keyframe.
+
+    keyframe: {'seq': n, 'keyframe': True, 'state': gameData}
+    delta:    {'seq': n, 'keyframe': False, 'currentPosition': (x,y),
+               'added': {key: [...]}, 'removed': {key: [...]}}
+
+In deltas, teammates are listed under 'teammates' as [name, (x,y)] pairs.
+"""
+
+from typing import Optional
+
+POSITION_KEYS = ('enemyPositions', 'coin1', 'coin2', 'coin3', 'walls')
+
+
+def toEntities(gameData: dict) -> dict[str, set]:
+    entities = {key: {tuple(loc) for loc in gameData[key]} for key in POSITION_KEYS}
+    entities['teammates'] = {(name, tuple(loc)) for name, loc in
+                             zip(gameData['teammateNames'], gameData['teammatePositions'])}
+    return entities
+
+
+def fromEntities(entities: dict[str, set], currentPosition: tuple[int, int]) -> dict:
+    teammates = sorted(entities['teammates'], key=lambda teammate: teammate[1])
+    return {'teammateNames': [name for name, _ in teammates],
+            'teammatePositions': [loc for _, loc in teammates],
+            'enemyPositions': sorted(entities['enemyPositions']),
+            'currentPosition': currentPosition,
+            'coin1': sorted(entities['coin1']),
+            'coin2': sorted(entities['coin2']),
+            'coin3': sorted(entities['coin3']),
+            'walls': sorted(entities['walls'])}
+
+
+class ViewTracker:
+    def __init__(self, keyframeInterval: int = 20):
+        """
+        :param keyframeInterval: Number of encoded views between full keyframes
+        """
+        assert isinstance(keyframeInterval, int) and keyframeInterval > 0
+        self.keyframeInterval = keyframeInterval
+        self.__deltaPlayers: set[str] = set()
+        self.__lastViews: dict[str, dict[str, set]] = {}
+        self.__lastPositions: dict[str, tuple[int, int]] = {}
+        self.__sinceKeyframe: dict[str, int] = {}
+        self.__seq: dict[str, int] = {}
+
+    def enable(self, playerName: str):
+        """
+        Switches a player to delta messages, players that were never enabled receive full views
+        """
+        self.__deltaPlayers.add(playerName)
+
+    def isEnabled(self, playerName: str) -> bool:
+        return playerName in self.__deltaPlayers
+
+    def reset(self, playerName: str):
+        """
+        Forces a keyframe on the next encode for playerName
+        """
+        self.__lastViews.pop(playerName, None)
+
+    def encode(self, playerName: str, gameData: dict) -> Optional[dict]:
+        """
+        :return: The message to publish, or None if the view has not changed
+        """
+        if playerName not in self.__deltaPlayers:
+            return gameData
+
+        entities = toEntities(gameData)
+        last = self.__lastViews.get(playerName)
+        lastPosition = self.__lastPositions.get(playerName)
+        sinceKeyframe = self.__sinceKeyframe.get(playerName, 0) + 1
+        self.__lastViews[playerName] = entities
+        self.__lastPositions[playerName] = gameData['currentPosition']
+
+        if last is None or sinceKeyframe >= self.keyframeInterval:
+            self.__sinceKeyframe[playerName] = 0
+            return {'seq': self.__nextSeq(playerName), 'keyframe': True, 'state': gameData}
+
+        self.__sinceKeyframe[playerName] = sinceKeyframe
+        added = {key: sorted(entities[key] - last[key]) for key in entities if entities[key] - last[key]}
+        removed = {key: sorted(last[key] - entities[key]) for key in entities if last[key] - entities[key]}
+        if not added and not removed and lastPosition == gameData['currentPosition']:
+            return None
+
+        return {'seq': self.__nextSeq(playerName), 'keyframe': False,
+                'currentPosition': gameData['currentPosition'], 'added': added, 'removed': removed}
+
+    def __nextSeq(self, playerName: str) -> int:
+        self.__seq[playerName] = self.__seq.get(playerName, 0) + 1
+        return self.__seq[playerName]
+
+
+def applyDelta(state: Optional[dict], message: dict) -> Optional[dict]:
+    """
+    Client side of ViewTracker.encode
+    :param state: {'seq': n, 'entities': {...}, 'gameData': {...}} returned by the previous call, or None
+    :param message: Decoded game_state message
+    :return: The new state, or None when a delta arrives out of sequence and the client must wait for a keyframe
+    """
+    if message.get('keyframe'):
+        entities = toEntities(message['state'])
+        return {'seq': message['seq'], 'entities': entities,
+                'gameData': fromEntities(entities, tuple(message['state']['currentPosition']))}
+
+    if state is None or message['seq'] != state['seq'] + 1:
+        return None
+
+    entities = {key: set(locs) for key, locs in state['entities'].items()}
+    for key, items in message['removed'].items():
+        entities[key] -= {(item[0], tuple(item[1])) if key == 'teammates' else tuple(item) for item in items}
+    for key, items in message['added'].items():
+        entities[key] |= {(item[0], tuple(item[1])) if key == 'teammates' else tuple(item) for item in items}
+
+    return {'seq': message['seq'], 'entities': entities,
+            'gameData': fromEntities(entities, tuple(message['currentPosition']))}
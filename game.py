@@ -2,25 +2,117 @@
 Author: Charles Lee
 """
 
+import layouts
 from map import Map
 from moveset import Moveset
 from player import Player
 from team import Team
 from gameItems import *
+import re
 import random
+from typing import Optional
 
 class Game:
-    def __init__(self, playerNames: dict[str,list[str]], width: int = 10, height: int = 10):
+    def __init__(self, playerNames: dict[str,list[str]], width: int = 10, height: int = 10, compact: bool = False,
+                 wallStyle: str = 'classic', wallSeed: Optional[int] = None, wallOptions: Optional[dict] = None,
+                 seed: Optional[int] = None):
         """
         :param playerNames: Dictionary for each team name with a list of player names
+        :param compact: Back the map with the array-based CompactGrid
+        :param wallStyle: Wall layout from layouts.LAYOUTS
+        :param wallSeed: Seed for the wall layout, layouts with the same seed and size are reused from the cache.
+                         Drawn from the game's seed if None.
+        :param wallOptions: Extra options for the layout generator, e.g. {'density': 0.2}
+        :param seed: Seed of the game's own random source, the same seed and players generate the same world,
+                     whether the world was generated here or ahead of time (fromWorld).
+                     Drawn from the module-level random state if None, and kept in self.seed either way.
         """
         self.numTeams = len(playerNames)
 
         self.teams, self.all_players = self.__initializePlayers(playerNames)
 
+        self.seed = random.getrandbits(63) if seed is None else seed
+
         self.__height = height
         self.__width = width
-        self.map = Map(height, width, list(self.all_players.values()))
+        # Same two steps as a world from the warm pool, so a seed always means the same board
+        self.map = Game.generateWorld(height, width, self.seed, compact, wallStyle, wallSeed, wallOptions)
+        self.__placePlayers()
+
+    @staticmethod
+    def generateWorld(height: int, width: int, seed: int, compact: bool = True, wallStyle: str = 'classic',
+                      wallSeed: Optional[int] = None, wallOptions: Optional[dict] = None) -> Map:
+        """
+        Generates the walls and coins of a game, without players
+        :param wallSeed: Seed for the wall layout, drawn from Random(seed) if None
+        """
+        rng = random.Random(seed)
+        if wallSeed is None:
+            wallSeed = rng.getrandbits(32)
+        wallChoices = layouts.generate(wallStyle, height, width, wallSeed, **(wallOptions or {}))
+        return Map(height, width, [], list(wallChoices), compact=compact, rng=rng, exactWalls=wallStyle in layouts.EXACT)
+
+    @classmethod
+    def fromWorld(cls, playerNames: dict[str,list[str]], height: int, width: int, codes: bytes, numCoins: int,
+                  seed: int, compact: bool = True) -> 'Game':
+        """
+        Starts a game on a world generated ahead of time by generateWorld, see warmpool.py.
+        The result is the same game as Game(playerNames, width, height, compact, seed=seed).
+        :param codes: The cellCodes() of the world
+        :raises ValueError: if the world has fewer empty cells than players
+        """
+        game = cls.__new__(cls)
+        game.numTeams = len(playerNames)
+        game.teams, game.all_players = game.__initializePlayers(playerNames)
+        game.seed = seed
+
+        game.__height = height
+        game.__width = width
+        game.map = Map.restore(height, width, codes, [], numCoins, compact)
+        game.__placePlayers()
+        return game
+
+    def __placePlayers(self):
+        """
+        Places every player on an empty cell of the map, drawn with a random source seeded by the game's seed
+        """
+        self.rng = random.Random(self.seed)
+        emptyCells = [match.start() for match in re.finditer(b'\x00', self.map.cellCodes())]
+        if len(emptyCells) < len(self.all_players):
+            raise ValueError(f'Cannot place {len(self.all_players)} players on a {self.__height}x{self.__width} map '
+                             f'with {len(emptyCells)} empty cells')
+        for player, cell in zip(self.all_players.values(), self.rng.sample(emptyCells, len(self.all_players))):
+            player.loc = divmod(cell, self.__width)
+            self.map.set(player.loc, player)
+
+    @classmethod
+    def restore(cls, teamScores: dict[str, int], playerStates: list[tuple[str, str, tuple[int, int]]],
+                height: int, width: int, codes: bytes, numCoins: int, compact: bool = False,
+                seed: Optional[int] = None) -> 'Game':
+        """
+        Rebuilds a game in progress, see snapshot.py
+        :param teamScores: {teamName: score, ...}
+        :param playerStates: [(playerName, teamName, (x,y)), ...] in the order players were added
+        :param codes: The map's cellCodes()
+        :param seed: The seed the game was generated from, if known
+        """
+        restored = cls.__new__(cls)
+        restored.seed = seed
+        restored.rng = random.Random(seed)
+        restored.numTeams = len(teamScores)
+        restored.teams = {}
+        for teamName, score in teamScores.items():
+            restored.teams[teamName] = Team(teamName)
+            restored.teams[teamName].increaseScore(score)
+        restored.all_players = {}
+        for playerName, teamName, loc in playerStates:
+            player = restored.all_players[playerName] = Player(playerName, restored.teams[teamName])
+            player.loc = loc
+
+        restored.__height = height
+        restored.__width = width
+        restored.map = Map.restore(height, width, codes, list(restored.all_players.values()), numCoins, compact)
+        return restored
 
     def __initializePlayers(self, playerNames: dict[str,list[str]]):
         teams = {}
@@ -55,6 +147,68 @@ class Game:
         self.map.set(new_loc, player)
         player.loc = new_loc
 
+    def resolveTurn(self, moves: dict[str, Moveset]) -> dict:
+        """
+        Applies every move of a turn simultaneously. The result does not depend on the order of moves:
+        moves off the map or into walls are dropped, players claiming the same cell or swapping cells stay put,
+        and players moving into a cell held by a player that stays put are blocked too.
+        :param moves: {playerName: Moveset, ...}, players without a move stay put
+        :return: {
+            moved: {playerName: ((x,y), (x,y)), ...},
+            coins: {playerName: ((x,y), value), ...},
+            scores: {teamName: scoreDelta, ...}
+        }
+        """
+        targets: dict[str, tuple[int, int]] = {}
+        for playerName in sorted(moves):
+            player = self.getPlayer(playerName)
+            dx, dy = moves[playerName].value
+            x, y = player.loc[0]+dx, player.loc[1]+dy
+            if 0 <= x < self.__height and 0 <= y < self.__width and not isinstance(self.map.get((x, y)), Wall):
+                targets[playerName] = (x, y)
+
+        claims: dict[tuple[int, int], int] = {}
+        for target in targets.values():
+            claims[target] = claims.get(target, 0) + 1
+        blocked = {playerName for playerName, target in targets.items() if claims[target] > 1}
+
+        for playerName, target in targets.items():
+            cell = self.map.get(target)
+            if isinstance(cell, Player) and targets.get(cell.name) == self.all_players[playerName].loc:
+                blocked.add(playerName)
+
+        # A blocked player keeps its cell, which can block whoever was moving into it
+        changed = True
+        while changed:
+            changed = False
+            for playerName, target in targets.items():
+                if playerName in blocked:
+                    continue
+                cell = self.map.get(target)
+                if isinstance(cell, Player) and (cell.name not in targets or cell.name in blocked):
+                    blocked.add(playerName)
+                    changed = True
+
+        movers = [playerName for playerName in targets if playerName not in blocked]
+        for playerName in movers:
+            self.map.set(self.all_players[playerName].loc, None)
+
+        diff = {'moved': {}, 'coins': {}, 'scores': {}}
+        for playerName in movers:
+            player = self.all_players[playerName]
+            target = targets[playerName]
+            cell = self.map.get(target)
+            if isinstance(cell, Coin):
+                player.team.increaseScore(cell.value)
+                self.map.decreaseCoin()
+                diff['coins'][playerName] = (target, cell.value)
+                diff['scores'][player.team.name] = diff['scores'].get(player.team.name, 0) + cell.value
+            diff['moved'][playerName] = (player.loc, target)
+            self.map.set(target, player)
+            player.loc = target
+
+        return diff
+
     def getPlayer(self, playerName: str) -> Player:
         assert isinstance(playerName, str)
         try:
@@ -79,7 +233,19 @@ class Game:
         """
         assert isinstance(playerName, str)
         assert isinstance(visionRadius, int)
-        player = self.getPlayer(playerName)
+        return self.__gameData(self.getPlayer(playerName), visionRadius)
+
+    def getAllGameData(self, visionRadius: int = 2) -> dict[str, dict]:
+        """
+        getGameData for every player. Each player's window is read from the grid directly,
+        so the cost depends on the number of players and the vision radius, not the board size.
+        :param visionRadius:
+        :return: {playerName: gameData, ...} with the same gameData layout as getGameData
+        """
+        assert isinstance(visionRadius, int)
+        return {playerName: self.__gameData(player, visionRadius) for playerName, player in self.all_players.items()}
+
+    def __gameData(self, player: Player, visionRadius: int) -> dict:
         centerX, centerY = player.loc
         minX = max(centerX - visionRadius, 0)
         maxX = min(centerX + visionRadius, self.__height-1)
@@ -94,10 +260,8 @@ class Game:
                     'coin3': [],
                     'walls': []}
 
-        for x in range(minX, maxX+1):
-            for y in range(minY, maxY+1):
-                cell = self.map.get((x,y))
-                self.__addGameData(gameData, cell, (x,y), player)
+        for loc, cell in self.map.window(minX, maxX, minY, maxY):
+            self.__addGameData(gameData, cell, loc, player)
 
         return gameData
 
@@ -0,0 +1,221 @@
+"""
+Cell storage backends for Map.
+
+ObjectGrid keeps one Python object per cell. CompactGrid keeps a flat
+array('b') of cell codes plus a side table mapping player slots to Player
+objects, so an empty 10x10 board costs 100 bytes instead of 10 lists.
+"""
+
+import re
+from array import array
+from player import Player
+from gameItems import *
+
+EMPTY = 0
+WALL = 1
+COIN1 = 2
+COIN2 = 3
+COIN3 = 4
+PLAYER = 5  # codes >= PLAYER are player slots (code - PLAYER)
+
+MAX_PLAYERS = 127 - PLAYER + 1
+
+# Maps every player code to EMPTY, for bulk loads that place players separately
+NO_PLAYERS = bytes(range(PLAYER)) + bytes(256 - PLAYER)
+
+ITEM_CODES = {Wall: WALL, Coin1: COIN1, Coin2: COIN2, Coin3: COIN3}
+
+_NOT_EMPTY = re.compile(b'[^\x00]')
+
+
+def codeOf(item: object) -> int:
+    """
+    :return: The cell code for item, with every player mapped to PLAYER
+    """
+    if item is None:
+        return EMPTY
+    if isinstance(item, Player):
+        return PLAYER
+    return ITEM_CODES[type(item)]
+
+
+class ObjectGrid:
+    def __init__(self, height: int, width: int):
+        self.__cells: list[list[object]] = [[None for _ in range(width)] for _ in range(height)]
+
+    def get(self, x: int, y: int):
+        return self.__cells[x][y]
+
+    def set(self, x: int, y: int, item: object):
+        self.__cells[x][y] = item
+
+    def code(self, x: int, y: int) -> int:
+        return codeOf(self.__cells[x][y])
+
+    def rows(self):
+        return self.__cells
+
+    def toCodes(self) -> bytes:
+        """
+        :return: One cell code per cell in row-major order, every player as PLAYER
+        """
+        return bytes(codeOf(cell) for row in self.__cells for cell in row)
+
+    def load(self, codes: bytes):
+        """
+        Replaces every cell from toCodes() output, players are left out
+        """
+        items = [None] * 256
+        items[WALL:PLAYER] = [CompactGrid.ITEMS[code] for code in range(WALL, PLAYER)]
+        width = len(self.__cells[0]) if self.__cells else 0
+        self.__cells = [[items[code] for code in codes[start:start + width]] for start in range(0, len(codes), width)]
+
+    def copy(self) -> 'ObjectGrid':
+        clone = ObjectGrid(0, 0)
+        clone.__cells = [list(row) for row in self.__cells]
+        return clone
+
+    def window(self, minX: int, maxX: int, minY: int, maxY: int) -> list[tuple[tuple[int, int], object]]:
+        """
+        :return: The non-empty cells of the inclusive rectangle as (loc, cell), row by row
+        """
+        result = []
+        for x in range(minX, maxX + 1):
+            row = self.__cells[x]
+            for y in range(minY, maxY + 1):
+                if row[y] is not None:
+                    result.append(((x, y), row[y]))
+        return result
+
+
+class CompactGrid:
+    # Coins and walls carry no per-instance state, so every cell shares one object
+    ITEMS = {WALL: Wall(), COIN1: Coin1(), COIN2: Coin2(), COIN3: Coin3()}
+
+    def __init__(self, height: int, width: int):
+        self.__height = height
+        self.__width = width
+        self.__codes = array('b', bytes(height * width))
+        self.__players: list[Player] = []
+        self.__slots: dict[Player, int] = {}
+
+    @property
+    def codes(self) -> array:
+        return self.__codes
+
+    def get(self, x: int, y: int):
+        return self.__decode(self.__codes[x * self.__width + y])
+
+    def __decode(self, code: int):
+        if code == EMPTY:
+            return None
+        if code >= PLAYER:
+            return self.__players[code - PLAYER]
+        return CompactGrid.ITEMS[code]
+
+    def set(self, x: int, y: int, item: object):
+        self.__codes[x * self.__width + y] = self.__encode(item)
+
+    def code(self, x: int, y: int) -> int:
+        code = self.__codes[x * self.__width + y]
+        return PLAYER if code >= PLAYER else code
+
+    def rows(self):
+        for x in range(self.__height):
+            yield [self.get(x, y) for y in range(self.__width)]
+
+    def toCodes(self) -> bytes:
+        """
+        :return: One cell code per cell in row-major order, players as their slot codes (>= PLAYER)
+        """
+        return self.__codes.tobytes()
+
+    def load(self, codes: bytes):
+        """
+        Replaces every cell from toCodes() output, players are left out
+        """
+        assert len(codes) == len(self.__codes)
+        self.__codes = array('b', codes.translate(NO_PLAYERS))
+        self.__players = []
+        self.__slots = {}
+
+    def copy(self) -> 'CompactGrid':
+        clone = CompactGrid(0, 0)
+        clone.__height, clone.__width = self.__height, self.__width
+        clone.__codes = array('b', self.__codes)
+        clone.__players = list(self.__players)
+        clone.__slots = dict(self.__slots)
+        return clone
+
+    def window(self, minX: int, maxX: int, minY: int, maxY: int) -> list[tuple[tuple[int, int], object]]:
+        """
+        :return: The non-empty cells of the inclusive rectangle as (loc, cell), row by row
+        """
+        # The regex scans each row segment of the code array in C, without copying it
+        result = []
+        codes, width = self.__codes, self.__width
+        for x in range(minX, maxX + 1):
+            start = x * width
+            for match in _NOT_EMPTY.finditer(codes, start + minY, start + maxY + 1):
+                cell = match.start()
+                result.append(((x, cell - start), self.__decode(codes[cell])))
+        return result
+
+    def __encode(self, item: object) -> int:
+        if item is None:
+            return EMPTY
+        if isinstance(item, Player):
+            slot = self.__slots.get(item)
+            if slot is None:
+                slot = len(self.__players)
+                if slot >= MAX_PLAYERS:
+                    raise ValueError(f'CompactGrid supports at most {MAX_PLAYERS} players')
+                self.__slots[item] = slot
+                self.__players.append(item)
+            return PLAYER + slot
+        return ITEM_CODES[type(item)]
+
+
+class MapView:
+    """
+    Read-only row-proxy over a grid: view[x][y] returns the cell without copying the board.
+    Cells are shared with the map, so Player objects in a view are the live players.
+    """
+    def __init__(self, grid, height: int, width: int):
+        self.__grid = grid
+        self.__height = height
+        self.__width = width
+
+    def __len__(self):
+        return self.__height
+
+    def __getitem__(self, x: int) -> 'RowView':
+        if not -self.__height <= x < self.__height:
+            raise IndexError('map row index out of range')
+        return RowView(self.__grid, x % self.__height, self.__width)
+
+    def __iter__(self):
+        for x in range(self.__height):
+            yield RowView(self.__grid, x, self.__width)
+
+    def tolist(self) -> list[list[object]]:
+        return [list(row) for row in self]
+
+
+class RowView:
+    def __init__(self, grid, x: int, width: int):
+        self.__grid = grid
+        self.__x = x
+        self.__width = width
+
+    def __len__(self):
+        return self.__width
+
+    def __getitem__(self, y: int):
+        if not -self.__width <= y < self.__width:
+            raise IndexError('map column index out of range')
+        return self.__grid.get(self.__x, y % self.__width)
+
+    def __iter__(self):
+        for y in range(self.__width):
+            yield self.__grid.get(self.__x, y)
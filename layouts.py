@@ -0,0 +1,152 @@
+"""
+Wall layout generators for Map.
+
+Every generator takes (height, width, rng, **options) and returns walls as
+a tuple of (x, y). For the styles in EXACT, e.g. a maze, those are the
+walls and Map places every one of them. The others return candidate
+cells, and Map places a random number of them, as the original 'classic'
+board always did. generate() caches layouts by
+(style, height, width, seed, options), so lobbies created in bulk with the
+same seed share one precomputed wall set.
+"""
+
+import random
+from functools import lru_cache
+from typing import Callable, Optional
+
+
+def classic(height: int, width: int, rng: random.Random) -> tuple[tuple[int, int], ...]:
+    """
+    The original 10x10 pattern of vertical wall columns, a middle bar and a right-hand comb, scaled to any size
+    """
+    wall = []
+    for row in range(1, height-1):
+        for col in range(1, width-2, 2):
+            wall.append((row, col))
+    for col in range(2, width-1, 2):
+        wall.append((height//2 - 1, col))
+    for row in range(0, height-1, 2):
+        wall.append((row, width-2))
+    return tuple(wall)
+
+
+def randomWalls(height: int, width: int, rng: random.Random, density: float = 0.3) -> tuple[tuple[int, int], ...]:
+    """
+    :param density: Fraction of the board covered by walls
+    """
+    assert 0 <= density <= 1
+    cells = rng.sample(range(height*width), int(density * height*width))
+    return tuple(divmod(cell, width) for cell in cells)
+
+
+def maze(height: int, width: int, rng: random.Random) -> tuple[tuple[int, int], ...]:
+    """
+    Depth-first maze with rooms on even coordinates and walls between them
+    """
+    carved = {(0, 0)}
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack[-1]
+        neighbours = [(x+dx, y+dy) for dx, dy in ((-2, 0), (2, 0), (0, -2), (0, 2))
+                      if 0 <= x+dx < height and 0 <= y+dy < width and (x+dx, y+dy) not in carved]
+        if not neighbours:
+            stack.pop()
+            continue
+        nx, ny = rng.choice(neighbours)
+        carved.add(((x+nx)//2, (y+ny)//2))
+        carved.add((nx, ny))
+        stack.append((nx, ny))
+
+    return tuple((x, y) for x in range(height) for y in range(width) if (x, y) not in carved)
+
+
+def rooms(height: int, width: int, rng: random.Random, roomSize: int = 4) -> tuple[tuple[int, int], ...]:
+    """
+    Grid of roomSize x roomSize rooms separated by one-cell walls with one door per shared wall
+    """
+    assert roomSize > 0
+    step = roomSize + 1
+    wall = set()
+    for x in range(roomSize, height, step):
+        wall.update((x, y) for y in range(width))
+    for y in range(roomSize, width, step):
+        wall.update((x, y) for x in range(height))
+
+    # Punch a door through every wall segment between two neighbouring rooms
+    for x in range(roomSize, height, step):
+        for start in range(0, width, step):
+            wall.discard((x, rng.choice(range(start, min(start + roomSize, width)))))
+    for y in range(roomSize, width, step):
+        for start in range(0, height, step):
+            wall.discard((rng.choice(range(start, min(start + roomSize, height))), y))
+
+    return tuple(sorted(wall))
+
+
+def fromFile(height: int, width: int, rng: random.Random, path: str = '') -> tuple[tuple[int, int], ...]:
+    """
+    Loads a text layout where '#' marks a wall, tiled or cropped to fit the board
+    :param path: Path to the layout file
+    """
+    with open(path) as f:
+        pattern = [line.rstrip('\n') for line in f if line.strip()]
+    if not pattern:
+        return ()
+
+    patternWidth = max(len(line) for line in pattern)
+    wall = []
+    for x in range(height):
+        line = pattern[x % len(pattern)]
+        for y in range(width):
+            col = y % patternWidth
+            if col < len(line) and line[col] == '#':
+                wall.append((x, y))
+    return tuple(wall)
+
+
+LAYOUTS: dict[str, Callable[..., tuple[tuple[int, int], ...]]] = {
+    'classic': classic,
+    'random': randomWalls,
+    'maze': maze,
+    'rooms': rooms,
+    'file': fromFile,
+}
+
+# Styles whose output does not depend on the seed
+DETERMINISTIC = {'classic', 'file'}
+
+# Styles whose output is placed as is rather than sampled from
+EXACT = {'random', 'maze', 'rooms', 'file'}
+
+
+def registerLayout(style: str, generator: Callable[..., tuple[tuple[int, int], ...]], deterministic: bool = False,
+                   exact: bool = False):
+    LAYOUTS[style] = generator
+    DETERMINISTIC.discard(style)
+    EXACT.discard(style)
+    if deterministic:
+        DETERMINISTIC.add(style)
+    if exact:
+        EXACT.add(style)
+    _cachedLayout.cache_clear()
+
+
+def generate(style: str, height: int, width: int, seed: Optional[int] = None, **options) -> tuple[tuple[int, int], ...]:
+    """
+    :param style: One of LAYOUTS
+    :param seed: Seed for the layout. When None, a seed is drawn from the global random state.
+    :param options: Extra keyword arguments for the generator, e.g. density=0.2 or path='level.txt'
+    :return: Walls, or wall choices for styles not in EXACT, as a tuple of (x, y)
+    """
+    if style not in LAYOUTS:
+        raise KeyError(f'{style} is not a valid wall layout')
+    if style in DETERMINISTIC:
+        seed = None
+    elif seed is None:
+        seed = random.getrandbits(32)
+    return _cachedLayout(style, height, width, seed, tuple(sorted(options.items())))
+
+
+@lru_cache(maxsize=256)
+def _cachedLayout(style: str, height: int, width: int, seed: Optional[int], options: tuple) -> tuple[tuple[int, int], ...]:
+    return LAYOUTS[style](height, width, random.Random(seed), **dict(options))
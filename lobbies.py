@@ -0,0 +1,87 @@
+"""
+Bounded registry of resident lobbies with idle TTL and LRU eviction.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LobbyRegistry:
+    def __init__(self, maxLobbies: int = 1000, idleTTL: float = 600.0, lruMinIdle: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param maxLobbies: Most lobbies resident at once, new lobbies beyond it are rejected
+        :param idleTTL: Seconds without activity after which a lobby expires
+        :param lruMinIdle: When full, the least recently used lobby is evicted to make room if it has been idle this long
+        :param clock: Monotonic time source in seconds
+        """
+        assert maxLobbies > 0
+        self.maxLobbies = maxLobbies
+        self.idleTTL = idleTTL
+        self.lruMinIdle = lruMinIdle
+        self.__clock = clock
+        self.__lastActive: OrderedDict[str, float] = OrderedDict()
+        self.__evicted = 0
+        self.__rejected = 0
+
+    def __len__(self):
+        return len(self.__lastActive)
+
+    def __contains__(self, lobbyName: str):
+        return lobbyName in self.__lastActive
+
+    def touch(self, lobbyName: str):
+        """
+        Records activity on a resident lobby
+        """
+        if lobbyName in self.__lastActive:
+            self.__lastActive[lobbyName] = self.__clock()
+            self.__lastActive.move_to_end(lobbyName)
+
+    def admit(self, lobbyName: str) -> tuple[bool, Optional[str]]:
+        """
+        Makes a lobby resident, evicting the least recently used lobby if the registry is full and it is idle enough
+        :return: (admitted, evicted lobby name or None)
+        """
+        if lobbyName in self.__lastActive:
+            self.touch(lobbyName)
+            return True, None
+
+        evicted = None
+        if len(self.__lastActive) >= self.maxLobbies:
+            oldest, lastActive = next(iter(self.__lastActive.items()))
+            if self.__clock() - lastActive < self.lruMinIdle:
+                self.__rejected += 1
+                return False, None
+            self.remove(oldest)
+            self.__evicted += 1
+            evicted = oldest
+
+        self.__lastActive[lobbyName] = self.__clock()
+        return True, evicted
+
+    def remove(self, lobbyName: str):
+        self.__lastActive.pop(lobbyName, None)
+
+    def expire(self) -> list[str]:
+        """
+        Removes every lobby idle for longer than idleTTL, oldest first
+        :return: The expired lobby names
+        """
+        now = self.__clock()
+        expired = []
+        for lobbyName, lastActive in self.__lastActive.items():
+            if now - lastActive < self.idleTTL:
+                break
+            expired.append(lobbyName)
+        for lobbyName in expired:
+            self.remove(lobbyName)
+        self.__evicted += len(expired)
+        return expired
+
+    def stats(self) -> dict[str, int]:
+        return {'resident': len(self.__lastActive),
+                'maxLobbies': self.maxLobbies,
+                'evicted': self.__evicted,
+                'rejected': self.__rejected}
@@ -2,22 +2,16 @@
 Author: Charles Lee
 """
 
-from copy import deepcopy
 from player import Player
+import re
 import random
-from gameItems import *
+from itertools import compress
 from typing import Optional
+import layouts
+from grid import ObjectGrid, CompactGrid, MapView, codeOf, WALL, COIN1, COIN2, COIN3, PLAYER
 
-def getDefaultWallChoices():
-    wall = []
-    for row in range(1,9):
-        for col in range(1,8,2):
-            wall.append((row,col))
-    for col in range(2,9,2):
-        wall.append((4,col))
-    for row in range(0,9,2):
-        wall.append((row,8))
-    return wall
+def getDefaultWallChoices(height: int = 10, width: int = 10):
+    return list(layouts.generate('classic', height, width))
 
 
 class Map:
@@ -25,19 +19,66 @@ class Map:
     COIN_MAX_RATIO = 0.2
     WALL_MIN_RATIO = 0.1
     WALL_MAX_RATIO = 0.3
-
-    def __init__(self, height: int, width: int, playersList: list[Player], wallChoices: list[tuple[int]] = None):
+    INDEX_KEYS = {COIN1: 'coin1', COIN2: 'coin2', COIN3: 'coin3', WALL: 'walls', PLAYER: 'players'}
+    COIN_KEYS = ('coin1', 'coin2', 'coin3')
+    # Translate table from cell codes to 1 for empty cells and 0 for anything else
+    FREE_CELLS = bytes((1,)) + bytes(255)
+
+    def __init__(self, height: int, width: int, playersList: list[Player], wallChoices: list[tuple[int]] = None,
+                 compact: bool = False, rng: Optional[random.Random] = None, exactWalls: bool = False):
+        """
+        :param compact: Store cells as an array('b') of cell codes instead of a list of lists of objects
+        :param rng: Random source for walls, players and coins, the module-level random state if None
+        :param exactWalls: Place every wall choice instead of a random number of them, see layouts.EXACT
+        """
         assert isinstance(width, int) and isinstance(height, int)
         assert isinstance(playersList, list)
+        self.__setup(height, width, compact)
+        if rng is not None:
+            self.__rng = rng
+
+        self.wallChoices = getDefaultWallChoices(height, width) if wallChoices is None else wallChoices
+
+        self.__fillMap(playersList, exactWalls)
+
+    def __setup(self, height: int, width: int, compact: bool):
         self.__height = height
         self.__width = width
-        self.__map: list[list[object]] = [[None for _ in range(width)] for _ in range(height)]
+        self.__grid = CompactGrid(height, width) if compact else ObjectGrid(height, width)
+        self.__index: dict[str, set[tuple[int, int]]] = {key: set() for key in Map.INDEX_KEYS.values()}
+        self.__snapshot: Optional[MapView] = None
+        self.__rng = random
 
         self.__numCoins = 0
 
-        self.wallChoices = getDefaultWallChoices() if wallChoices is None else wallChoices
-
-        self.__fillMap(playersList)
+    @classmethod
+    def restore(cls, height: int, width: int, codes: bytes, playersList: list[Player], numCoins: int,
+                compact: bool = False) -> 'Map':
+        """
+        Rebuilds a map saved with cellCodes() without generating a new one
+        :param codes: Row-major cell codes, codes >= PLAYER are skipped and players are placed at their loc instead
+        :param numCoins: Coins left to collect
+        """
+        assert len(codes) == height * width
+        restored = cls.__new__(cls)
+        restored.__setup(height, width, compact)
+        restored.__numCoins = numCoins
+        restored.__grid.load(codes)
+        # Index from a C-level scan per item code instead of a Python loop over every cell
+        for code, key in Map.INDEX_KEYS.items():
+            if code != PLAYER:
+                matches = re.finditer(re.escape(bytes((code,))), codes)
+                restored.__index[key].update(divmod(match.start(), width) for match in matches)
+        for player in playersList:
+            restored.__put(player.loc, player)
+        restored.wallChoices = list(restored.__index['walls'])
+        return restored
+
+    def cellCodes(self) -> bytes:
+        """
+        :return: The board as one byte per cell in row-major order, see grid.py for the codes
+        """
+        return self.__grid.toCodes()
 
 
     @property
@@ -48,8 +89,24 @@ class Map:
         self.__numCoins -= 1
 
     @property
-    def map(self):
-        return deepcopy(self.__map)
+    def map(self) -> MapView:
+        """
+        Zero-copy read-only view of the live board, indexed as map[x][y]
+        """
+        return MapView(self.__grid, self.__height, self.__width)
+
+    def snapshot(self) -> MapView:
+        """
+        Read-only view of the board as it is now. The grid is only copied the first time a snapshot is
+        requested after the map changes, so polling an unchanged board allocates nothing.
+        """
+        if self.__snapshot is None:
+            self.__snapshot = MapView(self.__grid.copy(), self.__height, self.__width)
+        return self.__snapshot
+
+    @property
+    def grid(self):
+        return self.__grid
 
     @property
     def height(self):
@@ -61,7 +118,7 @@ class Map:
 
     def __repr__(self):
         result = []
-        for row in self.__map:
+        for row in self.__grid.rows():
             row_str = []
             for cell in row:
                 if cell is None:
@@ -79,50 +136,117 @@ class Map:
 
     def set(self, loc: tuple[int, int], item: object):
         assert isinstance(loc, tuple) and len(loc) == 2 and isinstance(loc[0], int) and isinstance(loc[1], int)
-        self.__map[loc[0]][loc[1]] = item
+        self.__put(loc, item)
+
+    def __put(self, loc: tuple[int, int], item: object):
+        x, y = loc
+        oldKey = Map.INDEX_KEYS.get(self.__grid.code(x, y))
+        if oldKey is not None:
+            self.__index[oldKey].discard(loc)
+        newKey = Map.INDEX_KEYS.get(codeOf(item))
+        if newKey is not None:
+            self.__index[newKey].add(loc)
+        self.__grid.set(x, y, item)
+        self.__snapshot = None
+
+    def positions(self, key: str) -> list[tuple[int, int]]:
+        """
+        :param key: One of coin1, coin2, coin3, walls, players
+        :return: Sorted positions of every item of that type
+        """
+        return sorted(self.__index[key])
+
+    def itemsInRect(self, minX: int, maxX: int, minY: int, maxY: int) -> dict[str, list[tuple[int, int]]]:
+        """
+        Inclusive rectangle query over the position indexes, O(number of items) instead of O(area)
+        :return: {coin1: [(x,y),...], coin2: [...], coin3: [...], walls: [...], players: [...]}
+        """
+        result = {}
+        for key, locs in self.__index.items():
+            result[key] = sorted(loc for loc in locs if minX <= loc[0] <= maxX and minY <= loc[1] <= maxY)
+        return result
+
+    def nearestCoin(self, loc: tuple[int, int]) -> Optional[tuple[int, int]]:
+        """
+        :return: Position of the coin closest to loc by Manhattan distance, or None if no coins remain.
+                 Ties are broken by the smaller position.
+        """
+        x, y = loc
+        best = None
+        for key in Map.COIN_KEYS:
+            for coinLoc in self.__index[key]:
+                candidate = (abs(coinLoc[0] - x) + abs(coinLoc[1] - y), coinLoc)
+                if best is None or candidate < best:
+                    best = candidate
+        return None if best is None else best[1]
 
     def get(self, loc: tuple[int, int]):
         assert isinstance(loc, tuple) and len(loc) == 2 and isinstance(loc[0], int) and isinstance(loc[1], int)
-        return self.__map[loc[0]][loc[1]]
-
-    def __fillMap(self, players: list[Player]):
+        return self.__grid.get(loc[0], loc[1])
+
+    def window(self, minX: int, maxX: int, minY: int, maxY: int) -> list[tuple[tuple[int, int], object]]:
+        """
+        Reads only the cells of the inclusive rectangle, so the cost doesn't grow with the board
+        :return: The non-empty cells as (loc, cell), row by row
+        """
+        return self.__grid.window(minX, maxX, minY, maxY)
+
+    def __fillMap(self, players: list[Player], exactWalls: bool = False):
+        """
+        Places walls, players and coins by sampling without replacement from the free cells,
+        so generation is O(cells) regardless of board density.
+        """
         assert isinstance(players, list)
 
         empty = self.__width*self.__height
 
-        maxWalls = int(Map.WALL_MAX_RATIO * empty)
-        maxWalls = maxWalls if self.wallChoices is None else len(self.wallChoices)
+        # Duplicate or out of bounds wall choices can never be filled
+        wallChoices = [(x, y) for x, y in dict.fromkeys(self.wallChoices)
+                       if 0 <= x < self.__height and 0 <= y < self.__width]
+        maxWalls = len(wallChoices)
 
         minWalls = int(Map.WALL_MIN_RATIO * empty)
         minWalls = 0 if maxWalls < minWalls else minWalls
 
-        numWalls = random.randint(minWalls, maxWalls)
-        wallChoices = deepcopy(self.wallChoices)
-        for _ in range(numWalls):
-            self.__placeRandom(Wall(), wallChoices)
-
-        # Fill players
-        for player in players:
-            player.loc = self.__placeRandom(player)
+        rng = self.__rng
+        if exactWalls:
+            numWalls = maxWalls
+            walls = wallChoices
+        else:
+            numWalls = rng.randint(minWalls, maxWalls)
+            walls = rng.sample(wallChoices, numWalls)
 
         numPlayers = len(players)
         empty = empty - numWalls - numPlayers
+        if empty < 0:
+            raise ValueError(f'Cannot place {numPlayers} players on a {self.__height}x{self.__width} map '
+                             f'with {numWalls} walls')
+
+        self.__numCoins = rng.randint(int(Map.COIN_MIN_RATIO * empty), int(Map.COIN_MAX_RATIO * empty))
+
+        # The board is built as one code array and loaded in bulk, only the players go through __put
+        width = self.__width
+        codes = bytearray(self.__width*self.__height)
+        for x, y in walls:
+            codes[x * width + y] = WALL
+        freeCells = list(compress(range(len(codes)), codes.translate(Map.FREE_CELLS)))
+        drawn = rng.sample(freeCells, numPlayers + self.__numCoins)
+
+        # One bulk draw for every coin type, the same sequence as drawing them one at a time
+        coinTypes = rng.choices((COIN1, COIN2, COIN3), (6,3,1), k=self.__numCoins)
+        coinIndex = {code: self.__index[key] for key, code in zip(Map.COIN_KEYS, (COIN1, COIN2, COIN3))}
+        for cell, code in zip(drawn[numPlayers:], coinTypes):
+            codes[cell] = code
+            coinIndex[code].add(divmod(cell, width))
+
+        self.__grid.load(bytes(codes))
+        self.__index['walls'].update(walls)
+        self.__snapshot = None
 
-        self.__numCoins = random.randint(int(Map.COIN_MIN_RATIO * empty), int(Map.COIN_MAX_RATIO * empty))
-        for _ in range(self.__numCoins):
-            coin = random.choices((Coin1, Coin2, Coin3), (6,3,1))[0]()
-            self.__placeRandom(coin)
-
-    def __placeRandom(self, obj, choice: Optional[list] = None):
-        while True:
-            if choice is None:
-                x, y = random.randint(0, self.__height - 1), random.randint(0, self.__width - 1)
-            else:
-                x, y = random.choice(choice)
-                choice.remove((x,y))
-            if self.__map[x][y] is None:
-                self.__map[x][y] = obj
-                return x, y
+        # Fill players
+        for player, cell in zip(players, drawn):
+            player.loc = divmod(cell, width)
+            self.__put(player.loc, player)
 
 
 if __name__ == '__main__':
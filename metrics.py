@@ -0,0 +1,130 @@
+"""
+Lightweight instrumentation for the game server.
+
+Metrics holds named counters and latency histograms. Histograms use
+power-of-two microsecond buckets, so recording is O(1) with no allocation
+and percentiles are reported as the upper bound of their bucket (within a
+factor of two). snapshot() turns everything into a JSON-ready dict of
+rates and millisecond percentiles for the interval since the last reset.
+"""
+
+import math
+import time
+from typing import Callable
+
+NUM_BUCKETS = 32  # bucket i holds durations below 2**i microseconds, the last one everything longer
+PERCENTILES = (50, 90, 99)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        exponent = math.frexp(seconds * 1e6)[1] if seconds > 0 else 0
+        self.buckets[max(0, min(exponent, NUM_BUCKETS - 1))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct: float) -> float:
+        """
+        :return: Upper bound in seconds of the bucket holding the pct-th percentile, capped at the largest value seen
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(pct / 100 * self.count)
+        seen = 0
+        for i, bucketCount in enumerate(self.buckets):
+            seen += bucketCount
+            if seen >= rank:
+                return min(2 ** i / 1e6, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        summary = {'count': self.count,
+                   'meanMs': self.total / self.count * 1000 if self.count else 0.0,
+                   'maxMs': self.max * 1000}
+        for pct in PERCENTILES:
+            summary[f'p{pct}Ms'] = self.percentile(pct) * 1000
+        return summary
+
+
+class Timer:
+    __slots__ = ('histogram', 'clock', 'start')
+
+    def __init__(self, histogram: Histogram, clock: Callable[[], float]):
+        self.histogram = histogram
+        self.clock = clock
+
+    def __enter__(self):
+        self.start = self.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.clock() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        """
+        :param clock: Time source in seconds for timers and snapshot intervals
+        """
+        self.__clock = clock
+        self.__counters: dict[str, int] = {}
+        self.__histograms: dict[str, Histogram] = {}
+        self.__since = clock()
+
+    def count(self, name: str, amount: int = 1):
+        self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.__histograms.get(name)
+        if histogram is None:
+            histogram = self.__histograms[name] = Histogram()
+        return histogram
+
+    def observe(self, name: str, seconds: float):
+        self.histogram(name).observe(seconds)
+
+    def timer(self, name: str) -> Timer:
+        """
+        Context manager recording the duration of its block in the histogram name
+        """
+        return Timer(self.histogram(name), self.__clock)
+
+    def reset(self):
+        self.__counters.clear()
+        self.__histograms.clear()
+        self.__since = self.__clock()
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """
+        :param reset: Start a new interval afterwards
+        :return: {'intervalSeconds', 'counters', 'rates' (per second), 'histograms' (millisecond summaries)}
+        """
+        interval = max(self.__clock() - self.__since, 1e-9)
+        snapshot = {'intervalSeconds': interval,
+                    'counters': dict(self.__counters),
+                    'rates': {name: value / interval for name, value in self.__counters.items()},
+                    'histograms': {name: histogram.summary() for name, histogram in self.__histograms.items()}}
+        if reset:
+            self.reset()
+        return snapshot
+
+
+def topicKind(topic: str) -> str:
+    """
+    Groups topics for counters without a label per lobby or player, e.g. games/{lobby}/{player}/game_state -> game_state
+    """
+    levels = topic.split('/')
+    if levels[0] != 'games' or len(levels) < 3:
+        return topic
+    if levels[-1] in ('game_state', 'move'):
+        return levels[-1]
+    return '/'.join(levels[2:])
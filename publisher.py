@@ -0,0 +1,104 @@
+"""
+Outbound publish pipeline for end-of-turn broadcasts.
+
+Handlers queue their messages on a PublishBatch and flush once per turn.
+Without packing, a flush is still one publish per queued message: every
+player has their own game_state topic, so there is nothing to merge.
+Only with packing (PACK_UPDATES=1 on the server) does a turn cost a
+constant number of publishes per lobby. Every message for a lobby's game
+topics is then sent as one codec bundle on games/{lobby}/updates, and
+payloads that are identical, e.g. teammates with the same view, are
+stored in the bundle once.
+
+DELIVERY maps each kind of topic to its (qos, retain) policy: game state
+goes out at QoS 0, the latest full view and scores are retained so a
+client that (re)subscribes is in sync immediately, and only control
+traffic pays for QoS 1 acknowledgements.
+"""
+
+from typing import Optional
+
+import codec
+from metrics import Metrics, topicKind
+
+PACKED_SUFFIX = 'updates'
+
+DELIVERY: dict[str, tuple[int, bool]] = {
+    'game_state': (0, True),         # full views and keyframes
+    'game_state_delta': (0, False),  # deltas are useless without the message before them
+    'scores': (0, True),
+    'updates': (0, False),           # bundles, retained only when everything in them is
+    'lobby': (1, False),
+    'control': (1, False),           # new_game, start and move from the clients
+    'stats': (0, True),              # server metrics, the latest report is kept for dashboards
+}
+
+
+def delivery(kind: str) -> dict:
+    """
+    :return: {'qos': ..., 'retain': ...} for kind, ready to pass to publish as keyword arguments
+    """
+    qos, retain = DELIVERY[kind]
+    return {'qos': qos, 'retain': retain}
+
+
+class PublishBatch:
+    def __init__(self, client, pack: bool = False, metrics: Optional[Metrics] = None):
+        """
+        :param client: Anything with a paho-style publish(topic, payload, qos, retain)
+        :param pack: Send each lobby's game messages as a single bundle
+        :param metrics: Records flush time and counts the messages sent per topic kind
+        """
+        self.client = client
+        self.pack = pack
+        self.metrics = metrics
+        self.__messages: list[tuple[str, object, int, bool]] = []
+
+    def __len__(self):
+        return len(self.__messages)
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        self.__messages.append((topic, payload, qos, retain))
+
+    def flush(self) -> int:
+        """
+        Publishes everything queued since the last flush
+        :return: Number of publish calls made
+        """
+        messages, self.__messages = self.__messages, []
+        if self.metrics is None:
+            return self.__flush(messages)
+        with self.metrics.timer('publish.flush'):
+            return self.__flush(messages)
+
+    def __send(self, topic: str, payload, qos: int, retain: bool):
+        self.client.publish(topic, payload, qos=qos, retain=retain)
+        if self.metrics is not None:
+            self.metrics.count(f'out.{topicKind(topic)}')
+
+    def __flush(self, messages: list) -> int:
+        if not self.pack:
+            for topic, payload, qos, retain in messages:
+                self.__send(topic, payload, qos, retain)
+            return len(messages)
+
+        # Group game messages by lobby, lobby control messages stay on their own topic
+        bundles: dict[str, dict[str, object]] = {}
+        bundleQos: dict[str, int] = {}
+        bundleRetain: dict[str, bool] = {}
+        calls = 0
+        for topic, payload, qos, retain in messages:
+            parts = topic.split('/', 2)
+            if len(parts) == 3 and parts[0] == 'games' and parts[2] != 'lobby':
+                bundles.setdefault(parts[1], {})[parts[2]] = payload
+                bundleQos[parts[1]] = max(qos, bundleQos.get(parts[1], 0))
+                bundleRetain[parts[1]] = retain and bundleRetain.get(parts[1], True)
+            else:
+                self.__send(topic, payload, qos, retain)
+                calls += 1
+
+        for lobbyName, bundle in bundles.items():
+            self.__send(f'games/{lobbyName}/{PACKED_SUFFIX}', codec.encodeBundle(bundle),
+                        bundleQos[lobbyName], bundleRetain[lobbyName])
+            calls += 1
+        return calls
@@ -0,0 +1,60 @@
+"""
+Replays a turn log written by the server, without MQTT.
+
+    python replay.py turn_logs/TestLobby.1700000000000.turns             # final board and scores
+    python replay.py turn_logs/TestLobby.1700000000000.turns --turn 12   # board after turn 12
+    python replay.py turn_logs/TestLobby.1700000000000.turns --bench 100 # replay speed, for engine changes
+
+Replaying only runs Game.resolveTurn on the recorded moves, so recorded
+production traffic doubles as an engine benchmark.
+"""
+
+import sys
+import time
+import argparse
+from typing import Optional
+
+import snapshot
+from game import Game
+from turnlog import readTurnLog
+
+
+def replay(initial: bytes, turns: list, upTo: Optional[int] = None) -> Game:
+    """
+    :param upTo: Number of turns to apply, all of them if None
+    :return: The game as it was after that turn
+    """
+    game = snapshot.loadGame(initial)
+    for moves in turns[:upTo]:
+        game.resolveTurn(moves)
+    return game
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild any turn of a recorded game")
+    parser.add_argument('log', help="turn log file")
+    parser.add_argument('--turn', type=int, default=None, help="stop after this turn, 0 for the initial board")
+    parser.add_argument('--bench', type=int, default=0, metavar='N', help="replay the whole game N times and report turns/sec")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    seed, initial, turns = readTurnLog(args.log)
+    if args.turn is not None and not 0 <= args.turn <= len(turns):
+        print(f"{args.log} has {len(turns)} turns")
+        sys.exit(1)
+
+    game = replay(initial, turns, args.turn)
+    print(f"seed {seed}, {len(game.all_players)} players, {len(turns)} turns recorded")
+    print(f"after turn {len(turns) if args.turn is None else args.turn}:")
+    print(game.map)
+    print(game.getScores())
+
+    if args.bench:
+        start = time.perf_counter()
+        for _ in range(args.bench):
+            replay(initial, turns)
+        elapsed = time.perf_counter() - start
+        print(f"\nreplayed {args.bench} x {len(turns)} turns in {elapsed:.3f}s, "
+              f"{args.bench * len(turns) / elapsed:.1f} turns/sec")
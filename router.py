@@ -0,0 +1,62 @@
+"""
+Topic router for the server's subscriptions.
+
+Patterns use MQTT single-level wildcards ('+') and are compiled into a trie
+once. match() walks the topic with str.find instead of splitting it, only
+slices out the wildcard levels, and rejects topics with empty levels or
+the wrong depth before any handler runs.
+"""
+
+from typing import Callable, Optional
+
+_HANDLER = None  # trie key holding the handler of a complete pattern
+
+
+class TopicRouter:
+    def __init__(self, routes: Optional[dict[str, Callable]] = None):
+        """
+        :param routes: {pattern: handler, ...}
+        """
+        self.__root: dict = {}
+        for pattern, handler in (routes or {}).items():
+            self.add(pattern, handler)
+
+    def add(self, pattern: str, handler: Callable):
+        if '#' in pattern:
+            raise ValueError(f'Multi-level wildcards are not supported: {pattern}')
+        node = self.__root
+        for level in pattern.split('/'):
+            node = node.setdefault(level, {})
+        node[_HANDLER] = handler
+
+    def match(self, topic: str) -> Optional[tuple[Callable, tuple[str, ...]]]:
+        """
+        :return: (handler, values of the '+' levels in order), or None if no pattern matches
+        """
+        captures = []
+        handler = self.__match(self.__root, topic, 0, captures)
+        return None if handler is None else (handler, tuple(captures))
+
+    def __match(self, node: dict, topic: str, start: int, captures: list) -> Optional[Callable]:
+        end = topic.find('/', start)
+        last = end == -1
+        if last:
+            end = len(topic)
+        if end == start:
+            return None
+
+        # Literal levels take precedence over wildcards
+        child = node.get(topic[start:end])
+        if child is not None:
+            handler = child.get(_HANDLER) if last else self.__match(child, topic, end + 1, captures)
+            if handler is not None:
+                return handler
+
+        child = node.get('+')
+        if child is not None:
+            captures.append(topic[start:end])
+            handler = child.get(_HANDLER) if last else self.__match(child, topic, end + 1, captures)
+            if handler is not None:
+                return handler
+            captures.pop()
+        return None
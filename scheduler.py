@@ -0,0 +1,71 @@
+"""
+Hashed timing wheel for turn deadlines.
+
+One wheel drives every lobby on the server: timers are bucketed by the
+tick they expire on, so advancing the wheel only touches the buckets of
+elapsed ticks no matter how many lobbies are waiting.
+"""
+
+import math
+import time
+from typing import Callable, Hashable, Optional
+
+
+class TimerWheel:
+    def __init__(self, tickSeconds: float = 0.1, numSlots: int = 512, clock: Callable[[], float] = time.monotonic):
+        """
+        :param tickSeconds: Resolution of the wheel, timers fire on the first tick at or after their deadline
+        :param numSlots: Number of buckets, timers further away than numSlots ticks wait extra rotations
+        :param clock: Monotonic time source in seconds
+        """
+        assert tickSeconds > 0 and numSlots > 0
+        self.tickSeconds = tickSeconds
+        self.__clock = clock
+        self.__start = clock()
+        self.__tick = 0
+        self.__slots: list[list[list]] = [[] for _ in range(numSlots)]
+        self.__timers: dict[Hashable, list] = {}
+
+    def __len__(self):
+        return len(self.__timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__timers
+
+    def schedule(self, key: Hashable, delaySeconds: float, callback: Callable[[], None]):
+        """
+        Runs callback once delaySeconds have passed, replacing any timer already scheduled under key
+        """
+        self.cancel(key)
+        deadline = self.__tick + max(1, math.ceil(delaySeconds / self.tickSeconds))
+        entry = [deadline, key, callback]
+        self.__slots[deadline % len(self.__slots)].append(entry)
+        self.__timers[key] = entry
+
+    def cancel(self, key: Hashable):
+        entry = self.__timers.pop(key, None)
+        if entry is not None:
+            # Cancelled entries stay in their slot until it comes round, marked by a missing callback
+            entry[2] = None
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        Fires every timer whose deadline has passed
+        :return: Number of callbacks run
+        """
+        now = self.__clock() if now is None else now
+        target = int((now - self.__start) / self.tickSeconds)
+        fired = 0
+        while self.__tick < target:
+            self.__tick += 1
+            slot = self.__slots[self.__tick % len(self.__slots)]
+            due = [entry for entry in slot if entry[0] <= self.__tick]
+            slot[:] = [entry for entry in slot if entry[0] > self.__tick]
+            for entry in due:
+                deadline, key, callback = entry
+                if callback is None:
+                    continue
+                del self.__timers[key]
+                callback()
+                fired += 1
+        return fired
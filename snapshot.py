@@ -0,0 +1,94 @@
+"""
+Binary snapshots of a Game in progress, for checkpoints and the turn log.
+
+Big-endian, struct-packed:
+
+    header:  'GS' | version:B | flags:B | height:H | width:H | numCoins:I
+    teams:   count:H | (name, score:i)*
+    players: count:H | (name, team index:H, x:H, y:H)*
+    board:   height * width cell codes, one byte each (see grid.py)
+
+A name is length:B followed by UTF-8. Flag 0x01 marks a CompactGrid map.
+The board is copied straight out of a CompactGrid's code array, so taking
+a snapshot costs little more than the size of the board.
+"""
+
+import struct
+from typing import Optional
+
+from game import Game
+from grid import CompactGrid
+
+MAGIC = b'GS'
+VERSION = 1
+COMPACT = 0x01
+
+_HEADER = struct.Struct('>2sBBHHI')
+_COUNT = struct.Struct('>H')
+_SCORE = struct.Struct('>i')
+_PLAYER = struct.Struct('>HHH')
+
+
+def _packName(name: str) -> bytes:
+    encoded = name.encode()
+    assert len(encoded) < 256
+    return bytes((len(encoded),)) + encoded
+
+
+def _unpackName(data: bytes, offset: int) -> tuple[str, int]:
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode(), offset + 1 + length
+
+
+def dumpGame(game: Game) -> bytes:
+    gameMap = game.map
+    flags = COMPACT if isinstance(gameMap.grid, CompactGrid) else 0
+    parts = [_HEADER.pack(MAGIC, VERSION, flags, gameMap.height, gameMap.width, gameMap.numCoins),
+             _COUNT.pack(len(game.teams))]
+    teamIndex = {}
+    for i, (teamName, team) in enumerate(game.teams.items()):
+        teamIndex[teamName] = i
+        parts.append(_packName(teamName))
+        parts.append(_SCORE.pack(team.score))
+
+    parts.append(_COUNT.pack(len(game.all_players)))
+    for playerName, player in game.all_players.items():
+        parts.append(_packName(playerName))
+        parts.append(_PLAYER.pack(teamIndex[player.team.name], *player.loc))
+
+    parts.append(gameMap.cellCodes())
+    return b''.join(parts)
+
+
+def loadGame(data: bytes, seed: Optional[int] = None) -> Game:
+    """
+    :param seed: The seed the game was generated from, snapshots don't store it
+    """
+    magic, version, flags, height, width, numCoins = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a version {VERSION} game snapshot')
+    offset = _HEADER.size
+
+    teamScores = {}
+    teamNames = []
+    count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    for _ in range(count):
+        teamName, offset = _unpackName(data, offset)
+        teamScores[teamName], = _SCORE.unpack_from(data, offset)
+        offset += _SCORE.size
+        teamNames.append(teamName)
+
+    playerStates = []
+    count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    for _ in range(count):
+        playerName, offset = _unpackName(data, offset)
+        team, x, y = _PLAYER.unpack_from(data, offset)
+        offset += _PLAYER.size
+        playerStates.append((playerName, teamNames[team], (x, y)))
+
+    codes = data[offset:offset + height * width]
+    if len(codes) != height * width:
+        raise ValueError('Truncated game snapshot')
+    return Game.restore(teamScores, playerStates, height, width, codes, numCoins, bool(flags & COMPACT), seed)
@@ -0,0 +1,75 @@
+"""
+Round trips of the wire formats in codec.py, in both encodings.
+"""
+
+import random
+
+import pytest
+
+import codec
+from deltas import ViewTracker, applyDelta, fromEntities, toEntities
+from game import Game
+from moveset import Moveset
+
+TEAMS = {'Team1': ['Alice', 'Bob'], 'Team2': ['Carol', 'Dave']}
+
+
+def asTuples(gameData: dict) -> dict:
+    # JSON turns positions into lists
+    return {key: tuple(value) if key == 'currentPosition' else
+                 [tuple(item) if isinstance(item, list) else item for item in value]
+            for key, value in gameData.items()}
+
+
+def playTurns(game: Game, turns: int, seed: int):
+    rng = random.Random(seed)
+    for _ in range(turns):
+        yield game.getAllGameData()
+        game.resolveTurn({playerName: rng.choice(list(Moveset)) for playerName in game.all_players})
+
+
+@pytest.mark.parametrize('encoding', codec.ENCODINGS)
+def test_game_state_round_trip(encoding):
+    game = Game(TEAMS, 12, 12, compact=True, seed=7)
+    for views in playTurns(game, 20, 7):
+        for gameData in views.values():
+            assert asTuples(codec.decodeGameState(codec.encodeGameState(gameData, encoding))) == gameData
+
+
+@pytest.mark.parametrize('encoding', codec.ENCODINGS)
+def test_deltas_rebuild_every_view(encoding):
+    game = Game(TEAMS, 12, 12, compact=True, seed=3)
+    tracker = ViewTracker(keyframeInterval=5)
+    for playerName in game.all_players:
+        tracker.enable(playerName)
+
+    states = dict.fromkeys(game.all_players)
+    for views in playTurns(game, 30, 3):
+        for playerName, gameData in views.items():
+            message = tracker.encode(playerName, gameData)
+            if message is None:
+                continue
+            states[playerName] = applyDelta(states[playerName],
+                                            codec.decodeGameState(codec.encodeGameState(message, encoding)))
+            # fromEntities sorts every list, so compare against the canonical form of the view
+            expected = fromEntities(toEntities(gameData), gameData['currentPosition'])
+            assert states[playerName]['gameData'] == expected
+
+
+@pytest.mark.parametrize('encoding', codec.ENCODINGS)
+def test_scores_round_trip(encoding):
+    scores = {'Team1': 0, 'Team2': 17, 'Équipe 3': -4}
+    assert codec.decodeScores(codec.encodeScores(scores, encoding)) == scores
+
+
+def test_bundle_round_trip_stores_identical_payloads_once():
+    messages = {'Alice/game_state': b'\x01view', 'Bob/game_state': b'\x01view', 'scores': '{"Team1": 3}'}
+    bundle = codec.encodeBundle(messages)
+    assert codec.decodeBundle(bundle) == {'Alice/game_state': b'\x01view', 'Bob/game_state': b'\x01view',
+                                          'scores': b'{"Team1": 3}'}
+    assert bundle.count(b'\x01view') == 1
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        codec.encodeGameState({}, 'xml')
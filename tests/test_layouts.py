@@ -0,0 +1,35 @@
+"""
+Wall layouts: exact styles are placed as generated, 'classic' is sampled from.
+"""
+
+import pytest
+
+import layouts
+from game import Game
+
+TEAMS = {'Team1': ['Alice'], 'Team2': ['Bob']}
+
+
+@pytest.mark.parametrize('style, options', [('maze', {}), ('rooms', {}), ('random', {'density': 0.25})])
+def test_exact_layouts_place_every_wall(style, options):
+    game = Game(TEAMS, width=40, height=30, compact=True, wallStyle=style, wallSeed=5, wallOptions=options, seed=1)
+    assert game.map.positions('walls') == sorted(set(layouts.generate(style, 30, 40, 5, **options)))
+
+
+def test_random_density_is_the_wall_density():
+    game = Game(TEAMS, width=50, height=40, compact=True, wallStyle='random', wallSeed=2, wallOptions={'density': 0.2}, seed=1)
+    assert len(game.map.positions('walls')) == int(0.2 * 40 * 50)
+
+
+def test_classic_walls_are_sampled_from_the_choices():
+    choices = set(layouts.generate('classic', 30, 30))
+    walls = Game(TEAMS, 30, 30, compact=True, seed=1).map.positions('walls')
+    assert set(walls) <= choices
+    assert int(0.1 * 30 * 30) <= len(walls) <= len(choices)
+
+
+def test_players_and_coins_never_land_on_walls():
+    game = Game(TEAMS, 21, 21, compact=True, wallStyle='maze', seed=4)
+    walls = set(game.map.positions('walls'))
+    assert not walls & {player.loc for player in game.all_players.values()}
+    assert not walls & set(game.map.positions('coin1') + game.map.positions('coin2') + game.map.positions('coin3'))
@@ -0,0 +1,72 @@
+"""
+Resident lobby limits (lobbies.py): admission, LRU eviction and idle expiry on a fake clock.
+"""
+
+from lobbies import LobbyRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def registry(maxLobbies: int = 2) -> tuple[LobbyRegistry, Clock]:
+    clock = Clock()
+    return LobbyRegistry(maxLobbies, idleTTL=100, lruMinIdle=10, clock=clock), clock
+
+
+def test_admit_until_full():
+    lobbies, clock = registry()
+    assert lobbies.admit('Lobby1') == (True, None)
+    assert lobbies.admit('Lobby2') == (True, None)
+    assert lobbies.admit('Lobby1') == (True, None)
+    assert len(lobbies) == 2
+
+
+def test_full_registry_rejects_while_every_lobby_is_active():
+    lobbies, clock = registry()
+    lobbies.admit('Lobby1')
+    lobbies.admit('Lobby2')
+    clock.now = 5
+    assert lobbies.admit('Lobby3') == (False, None)
+    assert 'Lobby3' not in lobbies
+    assert lobbies.stats()['rejected'] == 1
+
+
+def test_full_registry_evicts_the_least_recently_used_idle_lobby():
+    lobbies, clock = registry()
+    lobbies.admit('Lobby1')
+    lobbies.admit('Lobby2')
+    clock.now = 20
+    lobbies.touch('Lobby1')
+    assert lobbies.admit('Lobby3') == (True, 'Lobby2')
+    assert 'Lobby2' not in lobbies and 'Lobby1' in lobbies and 'Lobby3' in lobbies
+    assert lobbies.stats() == {'resident': 2, 'maxLobbies': 2, 'evicted': 1, 'rejected': 0}
+
+
+def test_expire_removes_lobbies_idle_for_the_ttl():
+    lobbies, clock = registry(maxLobbies=3)
+    lobbies.admit('Lobby1')
+    clock.now = 50
+    lobbies.admit('Lobby2')
+    lobbies.admit('Lobby3')
+    clock.now = 90
+    lobbies.touch('Lobby3')
+    assert lobbies.expire() == []
+    clock.now = 150
+    assert lobbies.expire() == ['Lobby1', 'Lobby2']
+    assert 'Lobby3' in lobbies
+    assert lobbies.stats()['evicted'] == 2
+
+
+def test_touch_ignores_lobbies_that_are_not_resident():
+    lobbies, clock = registry()
+    lobbies.touch('Lobby1')
+    assert len(lobbies) == 0
+    lobbies.admit('Lobby1')
+    lobbies.remove('Lobby1')
+    lobbies.remove('Lobby1')
+    assert 'Lobby1' not in lobbies
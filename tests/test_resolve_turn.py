@@ -0,0 +1,129 @@
+"""
+Conflict rules of Game.resolveTurn. Replays and checkpoints depend on them being exact.
+
+Boards are drawn as rows of '.' (empty), '#' (wall) and '1'/'2'/'3' (coins).
+"""
+
+import itertools
+
+import pytest
+
+from game import Game
+from gameItems import Coin1
+from grid import EMPTY, WALL, COIN1, COIN2, COIN3
+from moveset import Moveset
+
+CODES = {'.': EMPTY, '#': WALL, '1': COIN1, '2': COIN2, '3': COIN3}
+UP, DOWN, LEFT, RIGHT = Moveset.UP, Moveset.DOWN, Moveset.LEFT, Moveset.RIGHT
+
+
+def makeGame(rows: list[str], players: dict[str, tuple[str, tuple[int, int]]], compact: bool = True) -> Game:
+    """
+    :param players: {playerName: (teamName, (x, y)), ...}
+    """
+    codes = bytes(CODES[cell] for row in rows for cell in row)
+    numCoins = sum(cell in '123' for row in rows for cell in row)
+    teamScores = {teamName: 0 for teamName, _ in players.values()}
+    playerStates = [(playerName, teamName, loc) for playerName, (teamName, loc) in players.items()]
+    return Game.restore(teamScores, playerStates, len(rows), len(rows[0]), codes, numCoins, compact)
+
+
+def locs(game: Game) -> dict[str, tuple[int, int]]:
+    return {playerName: player.loc for playerName, player in game.all_players.items()}
+
+
+@pytest.fixture(params=[True, False], ids=['compact', 'object'])
+def compact(request):
+    return request.param
+
+
+def test_free_moves_apply(compact):
+    game = makeGame(['...', '...', '...'], {'a': ('A', (1, 1)), 'b': ('B', (0, 0))}, compact)
+    diff = game.resolveTurn({'a': DOWN, 'b': RIGHT})
+    assert locs(game) == {'a': (2, 1), 'b': (0, 1)}
+    assert diff['moved'] == {'a': ((1, 1), (2, 1)), 'b': ((0, 0), (0, 1))}
+    assert game.map.get((1, 1)) is None and game.map.get((0, 0)) is None
+
+
+def test_moves_off_the_map_or_into_walls_are_dropped(compact):
+    game = makeGame(['.#', '..'], {'a': ('A', (0, 0)), 'b': ('B', (1, 1))}, compact)
+    diff = game.resolveTurn({'a': RIGHT, 'b': DOWN})
+    assert locs(game) == {'a': (0, 0), 'b': (1, 1)}
+    assert diff['moved'] == {}
+
+
+def test_swap_is_blocked(compact):
+    game = makeGame(['..'], {'a': ('A', (0, 0)), 'b': ('B', (0, 1))}, compact)
+    diff = game.resolveTurn({'a': RIGHT, 'b': LEFT})
+    assert locs(game) == {'a': (0, 0), 'b': (0, 1)}
+    assert diff['moved'] == {}
+
+
+def test_rotation_is_allowed():
+    game = makeGame(['..', '..'], {'a': ('A', (0, 0)), 'b': ('A', (0, 1)), 'c': ('B', (1, 1)), 'd': ('B', (1, 0))})
+    game.resolveTurn({'a': RIGHT, 'b': DOWN, 'c': LEFT, 'd': UP})
+    assert locs(game) == {'a': (0, 1), 'b': (1, 1), 'c': (1, 0), 'd': (0, 0)}
+    for playerName, player in game.all_players.items():
+        assert game.map.get(player.loc) is player
+
+
+def test_every_claimant_of_a_cell_stays_put(compact):
+    game = makeGame(['...', '...', '...'],
+                    {'a': ('A', (0, 1)), 'b': ('B', (1, 0)), 'c': ('B', (1, 2)), 'd': ('A', (2, 1))}, compact)
+    diff = game.resolveTurn({'a': DOWN, 'b': RIGHT, 'c': LEFT, 'd': UP})
+    assert locs(game) == {'a': (0, 1), 'b': (1, 0), 'c': (1, 2), 'd': (2, 1)}
+    assert diff['moved'] == {}
+    assert game.map.get((1, 1)) is None
+
+
+def test_follower_moves_into_a_cell_being_vacated(compact):
+    game = makeGame(['...'], {'a': ('A', (0, 0)), 'b': ('B', (0, 1))}, compact)
+    game.resolveTurn({'a': RIGHT, 'b': RIGHT})
+    assert locs(game) == {'a': (0, 1), 'b': (0, 2)}
+
+
+def test_blocked_chain_propagates(compact):
+    # c stays put, so b is blocked, which blocks a in turn
+    game = makeGame(['...'], {'a': ('A', (0, 0)), 'b': ('A', (0, 1)), 'c': ('B', (0, 2))}, compact)
+    diff = game.resolveTurn({'a': RIGHT, 'b': RIGHT})
+    assert locs(game) == {'a': (0, 0), 'b': (0, 1), 'c': (0, 2)}
+    assert diff['moved'] == {}
+
+
+def test_chain_behind_a_contested_cell_is_blocked(compact):
+    # b and d both claim (0, 2), so b stays put and a behind it is blocked too
+    game = makeGame(['...', '...'], {'a': ('A', (0, 0)), 'b': ('A', (0, 1)), 'd': ('B', (1, 2))}, compact)
+    game.resolveTurn({'a': RIGHT, 'b': RIGHT, 'd': UP})
+    assert locs(game) == {'a': (0, 0), 'b': (0, 1), 'd': (1, 2)}
+
+
+def test_coin_is_collected_once_by_the_mover(compact):
+    game = makeGame(['.2.', '...'], {'a': ('A', (0, 0)), 'b': ('B', (1, 1))}, compact)
+    diff = game.resolveTurn({'a': RIGHT})
+    assert diff['coins'] == {'a': ((0, 1), 2)}
+    assert diff['scores'] == {'A': 2}
+    assert game.getScores() == {'A': 2, 'B': 0}
+    assert game.map.numCoins == 0
+    assert game.gameOver()
+
+
+def test_contested_coin_stays_on_the_board(compact):
+    game = makeGame(['1.', '..', '1.'], {'a': ('A', (1, 0)), 'b': ('B', (2, 1)), 'c': ('B', (0, 1))}, compact)
+    # a and b both claim the coin at (2, 0), c takes the one at (0, 0)
+    diff = game.resolveTurn({'a': DOWN, 'b': LEFT, 'c': LEFT})
+    assert isinstance(game.map.get((2, 0)), Coin1)
+    assert diff['coins'] == {'c': ((0, 0), 1)}
+    assert game.getScores() == {'A': 0, 'B': 1}
+    assert game.map.numCoins == 1
+
+
+def test_result_does_not_depend_on_move_order():
+    rows = ['.1..', '..#.', '2...', '..3.']
+    players = {'a': ('A', (0, 0)), 'b': ('A', (0, 2)), 'c': ('B', (2, 1)), 'd': ('B', (3, 3))}
+    moves = {'a': RIGHT, 'b': LEFT, 'c': UP, 'd': LEFT}
+    outcomes = set()
+    for order in itertools.permutations(moves):
+        game = makeGame(rows, players)
+        diff = game.resolveTurn({playerName: moves[playerName] for playerName in order})
+        outcomes.add((tuple(sorted(locs(game).items())), game.map.cellCodes(), tuple(sorted(diff['coins'].items()))))
+    assert len(outcomes) == 1
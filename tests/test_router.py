@@ -0,0 +1,62 @@
+"""
+Topic routing (router.py) of the server's subscriptions.
+"""
+
+import pytest
+
+from router import TopicRouter
+
+
+def newGame():
+    pass
+
+
+def start():
+    pass
+
+
+def move():
+    pass
+
+
+def stats():
+    pass
+
+
+ROUTER = TopicRouter({
+    'new_game': newGame,
+    'games/+/start': start,
+    'games/+/+/move': move,
+    'games/stats/start': stats,
+})
+
+
+@pytest.mark.parametrize('topic, route', [
+    ('new_game', (newGame, ())),
+    ('games/Lobby1/start', (start, ('Lobby1',))),
+    ('games/Lobby1/Alice/move', (move, ('Lobby1', 'Alice'))),
+    ('games/stats/start', (stats, ())),
+    # The literal 'stats' branch has no move, so the wildcard branch is tried next
+    ('games/stats/Alice/move', (move, ('stats', 'Alice'))),
+])
+def test_match(topic, route):
+    assert ROUTER.match(topic) == route
+
+
+@pytest.mark.parametrize('topic', [
+    '',
+    'new_game/extra',
+    'games/Lobby1',
+    'games/Lobby1/stop',
+    'games//start',
+    'games/Lobby1//move',
+    'games/Lobby1/Alice/move/',
+    'games/Lobby1/Alice/Bob/move',
+])
+def test_no_match(topic):
+    assert ROUTER.match(topic) is None
+
+
+def test_multi_level_wildcards_are_rejected():
+    with pytest.raises(ValueError):
+        TopicRouter({'games/#': stats})
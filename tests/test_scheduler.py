@@ -0,0 +1,73 @@
+"""
+Turn deadlines on the hashed timing wheel (scheduler.py), driven by explicit times rather than the clock.
+"""
+
+from scheduler import TimerWheel
+
+
+def wheel(numSlots: int = 8) -> tuple[TimerWheel, list]:
+    return TimerWheel(tickSeconds=1, numSlots=numSlots, clock=lambda: 0), []
+
+
+def test_timer_fires_on_the_first_tick_after_its_deadline():
+    timers, fired = wheel()
+    timers.schedule('Lobby1', 2.5, lambda: fired.append('Lobby1'))
+    assert timers.advance(2) == 0
+    assert 'Lobby1' in timers
+    assert timers.advance(3) == 1
+    assert fired == ['Lobby1']
+    assert 'Lobby1' not in timers
+    assert timers.advance(10) == 0
+
+
+def test_zero_delay_waits_for_the_next_tick():
+    timers, fired = wheel()
+    timers.schedule('Lobby1', 0, lambda: fired.append('Lobby1'))
+    assert timers.advance(0) == 0
+    assert timers.advance(1) == 1
+
+
+def test_schedule_replaces_the_timer_of_the_same_key():
+    timers, fired = wheel()
+    timers.schedule('Lobby1', 2, lambda: fired.append('first'))
+    timers.schedule('Lobby1', 4, lambda: fired.append('second'))
+    assert len(timers) == 1
+    timers.advance(3)
+    assert fired == []
+    timers.advance(4)
+    assert fired == ['second']
+
+
+def test_cancelled_timer_never_fires():
+    timers, fired = wheel()
+    timers.schedule('Lobby1', 2, lambda: fired.append('Lobby1'))
+    timers.schedule('Lobby2', 2, lambda: fired.append('Lobby2'))
+    timers.cancel('Lobby1')
+    timers.cancel('unknown')
+    assert timers.advance(5) == 1
+    assert fired == ['Lobby2']
+
+
+def test_timers_further_than_one_rotation_wait_for_their_round():
+    timers, fired = wheel(numSlots=4)
+    timers.schedule('far', 10, lambda: fired.append('far'))
+    timers.schedule('near', 2, lambda: fired.append('near'))
+    timers.advance(6)
+    assert fired == ['near']
+    timers.advance(9)
+    assert fired == ['near']
+    timers.advance(10)
+    assert fired == ['near', 'far']
+
+
+def test_callback_can_schedule_the_next_deadline():
+    timers, fired = wheel()
+
+    def turn():
+        fired.append(len(fired))
+        timers.schedule('Lobby1', 2, turn)
+
+    timers.schedule('Lobby1', 2, turn)
+    timers.advance(7)
+    assert fired == [0, 1, 2]
+    assert 'Lobby1' in timers
@@ -0,0 +1,71 @@
+"""
+Round trips of game snapshots (snapshot.py) and checkpoint files (checkpoint.py).
+"""
+
+import random
+
+import pytest
+
+import snapshot
+from checkpoint import Checkpointer, decodeCheckpoint, encodeCheckpoint, readCheckpoint
+from game import Game
+from grid import CompactGrid
+from moveset import Moveset
+
+TEAMS = {'Team1': ['Alice', 'Bob'], 'Team2': ['Carol', 'Dave', 'Eve']}
+
+
+def randomMoves(game: Game, rng: random.Random) -> dict[str, Moveset]:
+    return {playerName: rng.choice(list(Moveset)) for playerName in game.all_players}
+
+
+def state(game: Game) -> tuple:
+    return (game.map.cellCodes() if isinstance(game.map.grid, CompactGrid) else repr(game.map),
+            {playerName: player.loc for playerName, player in game.all_players.items()},
+            game.getScores(), game.map.numCoins)
+
+
+@pytest.mark.parametrize('compact', [True, False], ids=['compact', 'object'])
+def test_restored_game_plays_the_same_turns(compact):
+    rng = random.Random(11)
+    game = Game(TEAMS, 15, 20, compact=compact, seed=11)
+    for _ in range(10):
+        game.resolveTurn(randomMoves(game, rng))
+
+    restored = snapshot.loadGame(snapshot.dumpGame(game), seed=game.seed)
+    assert restored.seed == game.seed
+    assert state(restored) == state(game)
+    assert snapshot.dumpGame(restored) == snapshot.dumpGame(game)
+    for _ in range(20):
+        moves = randomMoves(game, rng)
+        assert restored.resolveTurn(moves) == game.resolveTurn(moves)
+        assert state(restored) == state(game)
+        assert restored.getAllGameData() == game.getAllGameData()
+
+
+def test_corrupt_snapshots_are_rejected():
+    data = snapshot.dumpGame(Game(TEAMS, 10, 10, compact=True, seed=1))
+    with pytest.raises(ValueError):
+        snapshot.loadGame(b'XX' + data[2:])
+    with pytest.raises(ValueError):
+        snapshot.loadGame(data[:-1])
+
+
+def test_checkpoint_round_trip():
+    records = {'Lobby1': b'\x00\x01', 'Lobby 2': b'', 'Lobbý3': bytes(range(256))}
+    assert decodeCheckpoint(encodeCheckpoint(records)) == records
+
+
+def test_checkpointer_writes_only_live_lobbies(tmp_path):
+    path = str(tmp_path / 'lobbies.checkpoint')
+    lobbies = {'Lobby1': b'one', 'Lobby2': b'two'}
+    checkpointer = Checkpointer(path)
+    for lobbyName in lobbies:
+        checkpointer.markDirty(lobbyName)
+    assert checkpointer.checkpoint(lobbies.get) == 2
+    checkpointer.forget('Lobby2')
+    checkpointer.markDirty('Gone')
+    checkpointer.checkpoint(lobbies.get)
+    checkpointer.close()
+    assert readCheckpoint(path) == {'Lobby1': b'one'}
+    assert not (tmp_path / 'lobbies.checkpoint.tmp').exists()
@@ -0,0 +1,71 @@
+"""
+Loopback transport: MQTT filter matching and retained messages.
+"""
+
+import pytest
+
+import transport
+from transport import LoopbackBroker, topic_matches
+
+
+@pytest.mark.parametrize('pattern, topic, matches', [
+    ('games/L1/scores', 'games/L1/scores', True),
+    ('games/+/scores', 'games/L1/scores', True),
+    ('games/+/scores', 'games/L1/p1/scores', False),
+    ('games/#', 'games/L1/p1/game_state', True),
+    ('games/#', 'games', True),
+    ('games/+', 'games', False),
+    ('games/L1', 'games/L1/scores', False),
+    ('#', '$SYS/uptime', False),
+    ('+/uptime', '$SYS/uptime', False),
+    ('$SYS/#', '$SYS/uptime', True),
+])
+def test_topic_matches(pattern, topic, matches):
+    assert topic_matches(pattern, topic) is matches
+
+
+def connectedClient(broker: LoopbackBroker) -> tuple[transport.LoopbackClient, list]:
+    received = []
+    client = transport.create_client(broker=broker)
+    client.on_message = lambda client, userdata, msg: received.append((msg.topic, msg.payload, msg.retain))
+    transport.connect(client)
+    return client, received
+
+
+def test_retained_message_reaches_late_subscribers():
+    broker = LoopbackBroker()
+    publisher, _ = connectedClient(broker)
+    publisher.publish('games/L1/scores', b'{"A": 1}', retain=True)
+    publisher.publish('games/L1/lobby', b'not kept')
+
+    subscriber, received = connectedClient(broker)
+    subscriber.subscribe('games/L1/#')
+    subscriber.loop(timeout=0)
+    assert received == [('games/L1/scores', b'{"A": 1}', True)]
+
+    publisher.publish('games/L1/scores', b'{"A": 2}', retain=True)
+    subscriber.loop(timeout=0)
+    # Live messages are delivered without the retain flag, like a broker forwarding to a current subscriber
+    assert received[-1] == ('games/L1/scores', b'{"A": 2}', False)
+    assert broker.retained() == {'games/L1/scores': b'{"A": 2}'}
+
+
+def test_empty_retained_payload_clears_the_topic():
+    broker = LoopbackBroker()
+    publisher, _ = connectedClient(broker)
+    publisher.publish('games/L1/scores', b'{"A": 1}', retain=True)
+    publisher.publish('games/L1/scores', b'', retain=True)
+    assert broker.retained() == {}
+
+    subscriber, received = connectedClient(broker)
+    subscriber.subscribe('games/+/scores')
+    subscriber.loop(timeout=0)
+    assert received == []
+
+
+def test_standalone_scripts_refuse_loopback(monkeypatch):
+    monkeypatch.setenv('MQTT_TRANSPORT', transport.LOOPBACK)
+    with pytest.raises(ValueError):
+        transport.require_remote_broker()
+    monkeypatch.setenv('MQTT_TRANSPORT', transport.TLS)
+    transport.require_remote_broker()
@@ -0,0 +1,62 @@
+"""
+Turn logs: what the server writes (turnlog.py) replays to the same game (replay.py).
+"""
+
+import random
+
+import snapshot
+from game import Game
+from moveset import Moveset
+from replay import replay
+from turnlog import TurnLog, TurnLogWriter, logPath, readTurnLog
+
+TEAMS = {'Team1': ['Alice', 'Bob'], 'Team2': ['Carol', 'Dave']}
+
+
+def playTurns(game: Game, turnLog: TurnLog, writer: TurnLogWriter, numTurns: int, rng: random.Random) -> list[bytes]:
+    # Players that don't move are left out of the turn, like the server's deadline turns
+    snapshots = []
+    for turn in range(numTurns):
+        moves = {playerName: rng.choice(list(Moveset)) for playerName in game.all_players if rng.random() < 0.8}
+        turnLog.turn(moves)
+        game.resolveTurn(moves)
+        snapshots.append(snapshot.dumpGame(game))
+        if turn % 7 == 0:
+            writer.write(turnLog)
+    return snapshots
+
+
+def test_written_log_replays_every_turn(tmp_path):
+    rng = random.Random(3)
+    game = Game(TEAMS, 15, 12, compact=True, seed=3)
+    initial = snapshot.dumpGame(game)
+    path = logPath(str(tmp_path), 'Lobby', 1700000000)
+    turnLog = TurnLog(path, game, game.seed)
+    writer = TurnLogWriter()
+    snapshots = playTurns(game, turnLog, writer, 30, rng)
+    writer.write(turnLog)
+    writer.close()
+
+    seed, loggedInitial, turns = readTurnLog(path)
+    assert seed == 3
+    assert loggedInitial == initial
+    assert len(turns) == 30
+    assert snapshot.dumpGame(replay(loggedInitial, turns, 0)) == initial
+    for turn, expected in enumerate(snapshots, 1):
+        assert snapshot.dumpGame(replay(loggedInitial, turns, turn)) == expected
+
+
+def test_half_written_record_is_ignored(tmp_path):
+    game = Game(TEAMS, 10, 10, compact=True, seed=5)
+    path = logPath(str(tmp_path), 'Lobby', 1700000000)
+    turnLog = TurnLog(path, game)
+    turnLog.turn({'Alice': Moveset.UP, 'Carol': Moveset.LEFT})
+    turnLog.turn({'Bob': Moveset.DOWN})
+    data = turnLog.take()
+    with open(path, 'wb') as logFile:
+        logFile.write(data[:-1])
+
+    seed, _, turns = readTurnLog(path)
+    assert seed is None
+    assert turns == [{'Alice': Moveset.UP, 'Carol': Moveset.LEFT}]
+    assert turnLog.take() == b''
@@ -0,0 +1,80 @@
+"""
+Client payload validation (validation.py): moves and new_game payloads.
+"""
+
+import json
+
+import pytest
+
+from moveset import Moveset
+from validation import InputError, lobbyNameOf, parseMove, parseNewPlayer
+
+
+def newGame(**fields) -> bytes:
+    payload = {'lobby_name': 'Lobby1', 'team_name': 'Team1', 'player_name': 'Alice'}
+    payload.update(fields)
+    return json.dumps(payload).encode()
+
+
+@pytest.mark.parametrize('payload, move', [
+    (b'UP', Moveset.UP),
+    (b'LEFT', Moveset.LEFT),
+    (b' DOWN\n', Moveset.DOWN),
+    (b'{"move": "RIGHT"}', Moveset.RIGHT),
+])
+def test_valid_moves(payload, move):
+    assert parseMove(payload) is move
+
+
+@pytest.mark.parametrize('payload', [b'', b'up', b'JUMP', b'{"move": "JUMP"}', b'{"move": 1}', b'{"move"'])
+def test_invalid_moves(payload):
+    with pytest.raises(InputError) as error:
+        parseMove(payload)
+    assert error.value.code == 'invalid_move'
+
+
+def test_new_player_defaults():
+    player = parseNewPlayer(newGame())
+    assert (player.lobby_name, player.team_name, player.player_name) == ('Lobby1', 'Team1', 'Alice')
+    assert player.delta is False
+    assert player.encoding == 'json'
+
+
+def test_new_player_options():
+    player = parseNewPlayer(newGame(delta=True, encoding='binary'))
+    assert player.delta is True
+    assert player.encoding == 'binary'
+
+
+@pytest.mark.parametrize('fields, field', [
+    ({'player_name': 'a/b'}, 'player_name'),
+    ({'player_name': 'x' * 21}, 'player_name'),
+    ({'team_name': ''}, 'team_name'),
+    ({'encoding': 'xml'}, 'encoding'),
+    ({'team_name': 'started'}, 'team_name'),
+])
+def test_invalid_player_is_reported_to_its_lobby(fields, field):
+    with pytest.raises(InputError) as error:
+        parseNewPlayer(newGame(**fields))
+    assert error.value.code == 'invalid_player'
+    assert error.value.field == field
+    assert error.value.lobbyName == 'Lobby1'
+    assert error.value.toDict()['field'] == field
+
+
+@pytest.mark.parametrize('payload', [newGame(lobby_name='a+b'), newGame(lobby_name=5), b'not json', b'[1]'])
+def test_invalid_player_without_a_usable_lobby(payload):
+    with pytest.raises(InputError) as error:
+        parseNewPlayer(payload)
+    assert error.value.lobbyName is None
+
+
+@pytest.mark.parametrize('payload, lobbyName', [
+    (newGame(), 'Lobby1'),
+    (newGame(lobby_name=[1]), None),
+    (newGame(lobby_name='x' * 21), None),
+    (b'"Lobby1"', None),
+    (b'\xff', None),
+])
+def test_lobby_name_of(payload, lobbyName):
+    assert lobbyNameOf(payload) == lobbyName
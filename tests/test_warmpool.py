@@ -0,0 +1,27 @@
+"""
+Warm pool worlds: a world generated ahead of time with a seed is the same game as one generated in place.
+"""
+
+import pytest
+
+import warmpool
+from game import Game
+
+TEAMS = {'Team1': ['Alice', 'Carol'], 'Team2': ['Bob', 'Dave']}
+
+
+@pytest.mark.parametrize('style', ['classic', 'maze', 'rooms', 'random'])
+@pytest.mark.parametrize('seed', [1, 2, 2**62])
+def test_pool_world_matches_game_with_same_seed(style, seed):
+    inPlace = Game(TEAMS, width=12, height=9, compact=True, wallStyle=style, seed=seed)
+    pooled = Game.fromWorld(TEAMS, *warmpool.generateWorld(9, 12, seed, style))
+    assert pooled.seed == inPlace.seed
+    assert pooled.map.cellCodes() == inPlace.map.cellCodes()
+    assert pooled.map.numCoins == inPlace.map.numCoins
+    assert [player.loc for player in pooled.all_players.values()] == [player.loc for player in inPlace.all_players.values()]
+
+
+def test_world_without_room_for_players_is_rejected():
+    world = warmpool.generateWorld(2, 2, 3)
+    with pytest.raises(ValueError):
+        Game.fromWorld({'Team1': ['P1', 'P2', 'P3', 'P4', 'P5']}, *world)
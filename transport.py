@@ -0,0 +1,338 @@
+"""
+Pluggable MQTT transport for the server and the example clients.
+
+create_client() returns a paho client for the HiveMQ broker configured in
+credentials.env, or, with MQTT_TRANSPORT=loopback, a LoopbackClient attached
+to a broker living in this process. The loopback client implements the part
+of paho's interface the scripts use (callbacks, connect, reconnect,
+subscribe, publish, loop, loop_start/loop_stop, loop_forever, disconnect),
+so the same code runs against either one; loopback just has no network,
+TLS or credentials. Scripts run on their own call require_remote_broker(),
+since nothing outside their process could reach them over loopback.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+TLS = 'tls'
+LOOPBACK = 'loopback'
+TRANSPORTS = (TLS, LOOPBACK)
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """
+    MQTT filter matching: '+' matches one level, a trailing '#' matches the parent level and everything below it
+    """
+    # Wildcards at the first level don't match system topics
+    if topic.startswith('$') and pattern[:1] in ('+', '#'):
+        return False
+    patternLevels = pattern.split('/')
+    topicLevels = topic.split('/')
+    for i, level in enumerate(patternLevels):
+        if level == '#':
+            return True
+        if i >= len(topicLevels) or (level != '+' and level != topicLevels[i]):
+            return False
+    return len(patternLevels) == len(topicLevels)
+
+
+def _toBytes(payload) -> bytes:
+    # Same conversions as paho's publish
+    if payload is None:
+        return b''
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode()
+    if isinstance(payload, (int, float)):
+        return str(payload).encode()
+    raise TypeError('payload must be a string, bytearray, int, float or None.')
+
+
+class LoopbackMessage:
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'mid')
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False, mid: int = 0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class LoopbackPublishInfo:
+    # Stands in for paho's MQTTMessageInfo, delivery to the in-process broker is immediate
+    __slots__ = ('mid', 'rc')
+
+    def __init__(self, mid: int):
+        self.mid = mid
+        self.rc = 0
+
+    def is_published(self) -> bool:
+        return True
+
+    def wait_for_publish(self, timeout: Optional[float] = None):
+        pass
+
+
+class LoopbackBroker:
+    def __init__(self):
+        """
+        In-process broker: keeps subscriptions and retained messages and fans publishes out to client inboxes
+        """
+        self.__lock = threading.Lock()
+        self.__exact: dict[str, dict['LoopbackClient', int]] = {}  # {topic: {client: qos}}
+        self.__wildcard: dict[str, dict['LoopbackClient', int]] = {}  # {filter with + or #: {client: qos}}
+        self.__retained: dict[str, LoopbackMessage] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, client: 'LoopbackClient', pattern: str, qos: int = 0):
+        """
+        Adds a subscription and delivers the retained messages it matches
+        """
+        levels = pattern.split('/')
+        if not pattern or any(('#' in level and (level != '#' or i != len(levels) - 1)) or ('+' in level and level != '+')
+                              for i, level in enumerate(levels)):
+            raise ValueError(f'Invalid topic filter: {pattern}')
+        table = self.__wildcard if '+' in pattern or '#' in pattern else self.__exact
+        with self.__lock:
+            table.setdefault(pattern, {})[client] = qos
+            retained = [message for topic, message in self.__retained.items() if topic_matches(pattern, topic)]
+        for message in retained:
+            client._deliver(LoopbackMessage(message.topic, message.payload, min(qos, message.qos), True))
+
+    def unsubscribe(self, client: 'LoopbackClient', pattern: str):
+        with self.__lock:
+            for table in (self.__exact, self.__wildcard):
+                subscribers = table.get(pattern)
+                if subscribers is not None:
+                    subscribers.pop(client, None)
+                    if not subscribers:
+                        del table[pattern]
+
+    def disconnect(self, client: 'LoopbackClient'):
+        with self.__lock:
+            for table in (self.__exact, self.__wildcard):
+                for pattern in [pattern for pattern, subscribers in table.items() if client in subscribers]:
+                    del table[pattern][client]
+                    if not table[pattern]:
+                        del table[pattern]
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        if not topic or '+' in topic or '#' in topic:
+            raise ValueError(f'Invalid publish topic: {topic}')
+        with self.__lock:
+            self.published += 1
+            if retain:
+                # An empty retained payload clears the topic
+                if payload:
+                    self.__retained[topic] = LoopbackMessage(topic, payload, qos, True)
+                else:
+                    self.__retained.pop(topic, None)
+            # A client matching several filters gets one copy at the highest granted QoS
+            receivers: dict[LoopbackClient, int] = dict(self.__exact.get(topic, {}))
+            for pattern, subscribers in self.__wildcard.items():
+                if topic_matches(pattern, topic):
+                    for client, grantedQos in subscribers.items():
+                        receivers[client] = max(grantedQos, receivers.get(client, 0))
+            self.delivered += len(receivers)
+        for client, grantedQos in receivers.items():
+            client._deliver(LoopbackMessage(topic, payload, min(qos, grantedQos), False))
+
+    def retained(self) -> dict[str, bytes]:
+        with self.__lock:
+            return {topic: message.payload for topic, message in self.__retained.items()}
+
+    def reset(self):
+        """
+        Drops every subscription and retained message
+        """
+        with self.__lock:
+            self.__exact.clear()
+            self.__wildcard.clear()
+            self.__retained.clear()
+            self.published = 0
+            self.delivered = 0
+
+
+# Broker shared by every loopback client that isn't given its own
+DEFAULT_BROKER = LoopbackBroker()
+
+
+class LoopbackClient:
+    def __init__(self, client_id: str = '', userdata=None, broker: Optional[LoopbackBroker] = None):
+        """
+        paho-compatible client for a LoopbackBroker, callbacks run on whichever thread calls loop()
+        :param client_id: Kept as bytes in _client_id like paho
+        :param broker: Broker to attach to, DEFAULT_BROKER if None
+        """
+        self._client_id = client_id.encode() if isinstance(client_id, str) else client_id
+        self._userdata = userdata
+        self.broker = DEFAULT_BROKER if broker is None else broker
+        self.on_connect: Optional[Callable] = None
+        self.on_disconnect: Optional[Callable] = None
+        self.on_message: Optional[Callable] = None
+        self.on_publish: Optional[Callable] = None
+        self.on_subscribe: Optional[Callable] = None
+        self.__events: deque = deque()
+        self.__wakeup = threading.Condition()
+        self.__mid = 0
+        self.__connected = False
+        self.__thread: Optional[threading.Thread] = None
+        self.__stop = threading.Event()
+
+    def __nextMid(self) -> int:
+        self.__mid += 1
+        return self.__mid
+
+    def __queue(self, event):
+        with self.__wakeup:
+            self.__events.append(event)
+            self.__wakeup.notify()
+
+    def _deliver(self, message: LoopbackMessage):
+        # Called by the broker, possibly from another client's thread
+        self.__queue(message)
+
+    # Accepted for interface compatibility, the loopback broker has no TLS or authentication
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def username_pw_set(self, username=None, password=None):
+        pass
+
+    def user_data_set(self, userdata):
+        self._userdata = userdata
+
+    def is_connected(self) -> bool:
+        return self.__connected
+
+    def connect(self, host=None, port=None, keepalive=60, *args, **kwargs) -> int:
+        self.__connected = True
+        self.__queue(lambda: self.on_connect and self.on_connect(self, self._userdata, {}, 0, None))
+        return 0
+
+    def reconnect(self) -> int:
+        return self.connect()
+
+    def disconnect(self, *args, **kwargs) -> int:
+        if self.__connected:
+            self.__connected = False
+            self.broker.disconnect(self)
+            self.__queue(lambda: self.on_disconnect and self.on_disconnect(self, self._userdata, 0))
+        return 0
+
+    def subscribe(self, topic, qos: int = 0, *args, **kwargs) -> tuple[int, int]:
+        """
+        :param topic: a filter, or a list of (filter, qos) like paho
+        """
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        mid = self.__nextMid()
+        for pattern, patternQos in topics:
+            self.broker.subscribe(self, pattern, patternQos)
+        granted = [patternQos for _, patternQos in topics]
+        self.__queue(lambda: self.on_subscribe and self.on_subscribe(self, self._userdata, mid, granted, None))
+        return 0, mid
+
+    def unsubscribe(self, topic, *args, **kwargs) -> tuple[int, int]:
+        for pattern in (topic if isinstance(topic, list) else [topic]):
+            self.broker.unsubscribe(self, pattern)
+        return 0, self.__nextMid()
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False, properties=None) -> LoopbackPublishInfo:
+        mid = self.__nextMid()
+        self.broker.publish(topic, _toBytes(payload), qos, retain)
+        if self.on_publish is not None:
+            self.__queue(lambda: self.on_publish and self.on_publish(self, self._userdata, mid))
+        return LoopbackPublishInfo(mid)
+
+    def loop(self, timeout: float = 1.0, *args) -> int:
+        """
+        Waits up to timeout seconds for events, then runs the callbacks of every event queued so far
+        :return: 0 like paho's MQTT_ERR_SUCCESS
+        """
+        with self.__wakeup:
+            if not self.__events and timeout > 0:
+                self.__wakeup.wait(timeout)
+            events, self.__events = self.__events, deque()
+        for event in events:
+            if isinstance(event, LoopbackMessage):
+                if self.on_message is not None:
+                    self.on_message(self, self._userdata, event)
+            else:
+                event()
+        return 0
+
+    def loop_forever(self, *args, **kwargs) -> int:
+        while not self.__stop.is_set():
+            self.loop(1.0)
+        return 0
+
+    def loop_start(self) -> int:
+        if self.__thread is None:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.loop_forever, daemon=True)
+            self.__thread.start()
+        return 0
+
+    def loop_stop(self, *args) -> int:
+        if self.__thread is not None:
+            self.__stop.set()
+            with self.__wakeup:
+                self.__wakeup.notify()
+            if self.__thread is not threading.current_thread():
+                self.__thread.join()
+            self.__thread = None
+        return 0
+
+
+def transport_name() -> str:
+    transport = os.environ.get('MQTT_TRANSPORT', TLS).lower()
+    if transport not in TRANSPORTS:
+        raise ValueError(f'MQTT_TRANSPORT must be one of {TRANSPORTS}, not {transport}')
+    return transport
+
+
+def require_remote_broker():
+    """
+    For scripts run on their own: a loopback broker only reaches clients in the same process,
+    so a standalone player or server on it would never hear from anyone
+    :raises ValueError: if MQTT_TRANSPORT selects loopback
+    """
+    if transport_name() == LOOPBACK:
+        raise ValueError(f'MQTT_TRANSPORT={LOOPBACK} only connects clients within one process, '
+                         'run against a broker or use AutoPlayerClient.py --serve for a single-process game')
+
+
+def create_client(client_id: str = '', userdata=None, broker: Optional[LoopbackBroker] = None):
+    """
+    Creates an unconnected client for the transport selected by MQTT_TRANSPORT, 'tls' (default) or 'loopback'
+    :param broker: Broker for loopback clients, DEFAULT_BROKER if None
+    """
+    if broker is not None or transport_name() == LOOPBACK:
+        return LoopbackClient(client_id, userdata, broker)
+
+    # Only the TLS transport needs paho and the credentials file
+    import paho.mqtt.client as paho
+    from paho import mqtt
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path='./credentials.env')
+
+    client = paho.Client(callback_api_version=paho.CallbackAPIVersion.VERSION1, client_id=client_id, userdata=userdata, protocol=paho.MQTTv5)
+    # enable TLS for secure connection
+    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
+    # set username and password
+    client.username_pw_set(os.environ.get('USER_NAME'), os.environ.get('PASSWORD'))
+    return client
+
+
+def connect(client) -> int:
+    """
+    Connects a client from create_client, to HiveMQ Cloud on port 8883 (default for MQTT) unless it is a loopback client
+    """
+    if isinstance(client, LoopbackClient):
+        return client.connect()
+    return client.connect(os.environ.get('BROKER_ADDRESS'), int(os.environ.get('BROKER_PORT')))
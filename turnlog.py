@@ -0,0 +1,154 @@
+"""
+Append-only turn logs, one file per game.
+
+A log holds everything needed to rebuild every turn of a game without
+MQTT: the world seed and initial board, then the moves of each turn.
+resolveTurn doesn't depend on the order moves arrived in, so the moves of
+a turn are all a replay needs. Records are framed as kind:B | length:I |
+payload, big-endian:
+
+    start: 'S' | seed:q (-1 if unknown) | game snapshot (see snapshot.py)
+    turn:  'T' | count:B | (player index:B, move index:B)*
+
+Player indexes follow the snapshot's player order and move indexes the
+order of Moveset. Records are buffered in memory and appended to the file
+later, so a server with many lobbies doesn't hold a file open per lobby.
+The server hands the buffers to a TurnLogWriter, whose thread does the
+file I/O off the network loop.
+"""
+
+import os
+import struct
+import threading
+import traceback
+from typing import Optional
+
+import snapshot
+from game import Game
+from moveset import Moveset
+
+START = b'S'
+TURN = b'T'
+MOVES = list(Moveset)
+MOVE_INDEX = {move: i for i, move in enumerate(MOVES)}
+
+_FRAME = struct.Struct('>cI')
+_SEED = struct.Struct('>q')
+
+
+class TurnLog:
+    def __init__(self, path: str, game: Game, seed: Optional[int] = None):
+        """
+        Starts a log with the game's current board
+        :param seed: Seed the world was generated from, if known
+        """
+        self.path = path
+        self.__playerIndex = {playerName: i for i, playerName in enumerate(game.all_players)}
+        self.__buffer = bytearray()
+        self.__append(START, _SEED.pack(-1 if seed is None else seed) + snapshot.dumpGame(game))
+
+    def __append(self, kind: bytes, payload: bytes):
+        self.__buffer += _FRAME.pack(kind, len(payload))
+        self.__buffer += payload
+
+    def turn(self, moves: dict[str, Moveset]):
+        payload = bytearray((len(moves),))
+        for playerName, move in moves.items():
+            payload += bytes((self.__playerIndex[playerName], MOVE_INDEX[move]))
+        self.__append(TURN, bytes(payload))
+
+    def take(self) -> bytes:
+        """
+        :return: The records buffered since the last take, which are then dropped from the buffer
+        """
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        return data
+
+
+class TurnLogWriter:
+    def __init__(self):
+        """
+        Appends the records of many turn logs to their files on a background thread
+        """
+        self.__pending: list[tuple[str, bytes]] = []
+        self.__closed = False
+        self.__wakeup = threading.Condition()
+        self.__writer = threading.Thread(target=self.__run, daemon=True)
+        self.__writer.start()
+
+    def write(self, turnLog: TurnLog):
+        """
+        Takes the log's buffered records and queues them for the writer thread
+        """
+        data = turnLog.take()
+        if not data:
+            return
+        with self.__wakeup:
+            self.__pending.append((turnLog.path, data))
+            self.__wakeup.notify()
+
+    def close(self):
+        """
+        Waits until everything queued so far is on disk
+        """
+        with self.__wakeup:
+            self.__closed = True
+            self.__wakeup.notify()
+        self.__writer.join()
+
+    def __run(self):
+        while True:
+            with self.__wakeup:
+                while not self.__pending and not self.__closed:
+                    self.__wakeup.wait()
+                pending, self.__pending = self.__pending, []
+                if not pending:
+                    return
+            # Chunks of one file are queued in order, so appending them in order keeps each log intact
+            for path, data in pending:
+                try:
+                    _append(path, data)
+                except OSError:
+                    traceback.print_exc()
+
+
+def _append(path: str, data: bytes):
+    with open(path, 'ab') as logFile:
+        logFile.write(data)
+
+
+def logPath(directory: str, lobbyName: str, startedAt: float) -> str:
+    return os.path.join(directory, f'{lobbyName}.{int(startedAt * 1000)}.turns')
+
+
+def readTurnLog(path: str) -> tuple[Optional[int], bytes, list[dict[str, Moveset]]]:
+    """
+    :return: (seed or None, initial game snapshot, [{playerName: Moveset}, ...] for each turn)
+    """
+    with open(path, 'rb') as logFile:
+        data = logFile.read()
+
+    seed, initial, turns, playerNames = None, None, [], []
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        kind, length = _FRAME.unpack_from(data, offset)
+        offset += _FRAME.size
+        payload = data[offset:offset + length]
+        offset += length
+        # A crash can leave the last record half written
+        if len(payload) < length:
+            break
+        if kind == START:
+            seed, = _SEED.unpack_from(payload, 0)
+            seed = None if seed == -1 else seed
+            initial = payload[_SEED.size:]
+            playerNames = list(snapshot.loadGame(initial).all_players)
+        elif kind == TURN:
+            turns.append({playerNames[payload[i]]: MOVES[payload[i + 1]] for i in range(1, 1 + 2 * payload[0], 2)})
+        else:
+            raise ValueError(f'Unknown record {kind!r} in {path}')
+
+    if initial is None:
+        raise ValueError(f'{path} has no start record')
+    return seed, initial, turns
@@ -0,0 +1,100 @@
+"""
+Validation of client payloads, built on the models in InputTypes.
+
+Moves are the hot path: the four keywords are looked up directly in the
+raw payload bytes, and only a JSON object ({"move": "UP"}) goes through
+the precompiled Move validator. new_game payloads are validated straight
+from JSON bytes by a TypeAdapter compiled once at import. Every failure
+is raised as an InputError carrying a machine-readable code, so the
+server can report it to the lobby instead of crashing its callback.
+"""
+
+import re
+import json
+from typing import Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from InputTypes import NewPlayer, Move, TOPIC_LEVEL
+from moveset import Moveset
+
+MOVES: dict[bytes, Moveset] = {move.name.encode(): move for move in Moveset}
+
+# Keys the server keeps next to the teams in a lobby's team dict
+RESERVED_TEAM_NAMES = ('started',)
+
+_newPlayerAdapter = TypeAdapter(NewPlayer)
+_moveAdapter = TypeAdapter(Move)
+
+
+class InputError(ValueError):
+    def __init__(self, code: str, message: str, field: Optional[str] = None, lobbyName: Optional[str] = None):
+        """
+        :param code: Stable identifier clients can match on, e.g. 'invalid_move'
+        :param field: The offending field of the payload, if any
+        :param lobbyName: Lobby to report the error to, when the payload named one
+        """
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.field = field
+        self.lobbyName = lobbyName
+
+    def toDict(self) -> dict:
+        error = {'error': self.code, 'message': self.message}
+        if self.field is not None:
+            error['field'] = self.field
+        return error
+
+
+def _fromValidationError(code: str, error: ValidationError, lobbyName: Optional[str] = None) -> InputError:
+    first = error.errors()[0]
+    field = '.'.join(str(part) for part in first.get('loc', ())) or None
+    return InputError(code, first.get('msg', str(error)), field, lobbyName)
+
+
+def parseMove(payload: bytes) -> Moveset:
+    """
+    :param payload: UP, DOWN, LEFT or RIGHT, or a JSON Move object
+    :raises InputError: for anything else
+    """
+    move = MOVES.get(payload)
+    if move is not None:
+        return move
+    move = MOVES.get(payload.strip())
+    if move is not None:
+        return move
+    if payload[:1] == b'{':
+        try:
+            return Moveset[_moveAdapter.validate_json(payload).move]
+        except ValidationError as e:
+            raise _fromValidationError('invalid_move', e)
+    raise InputError('invalid_move', f"Move must be one of {', '.join(move.name for move in Moveset)}", 'move')
+
+
+def parseNewPlayer(payload: bytes) -> NewPlayer:
+    """
+    :raises InputError: with the lobby name when the payload had a usable one, so the error can be reported there
+    """
+    try:
+        player = _newPlayerAdapter.validate_json(payload)
+    except ValidationError as e:
+        raise _fromValidationError('invalid_player', e, lobbyNameOf(payload))
+    if player.team_name in RESERVED_TEAM_NAMES:
+        raise InputError('invalid_player', f"{player.team_name} is not a valid team name", 'team_name',
+                         player.lobby_name)
+    return player
+
+
+def lobbyNameOf(payload: bytes) -> Optional[str]:
+    """
+    Reads the lobby_name of a new_game payload without validating the rest of it
+    :return: The lobby name, or None if the payload has no valid one
+    """
+    try:
+        lobbyName = json.loads(payload).get('lobby_name')
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if isinstance(lobbyName, str) and re.match(TOPIC_LEVEL, lobbyName) and len(lobbyName) <= 20:
+        return lobbyName
+    return None
@@ -0,0 +1,111 @@
+"""
+Warm pool of worlds generated ahead of time in worker processes.
+
+A world is a board with its walls and coins but no players. The server
+keeps a few of them ready for each common board size, so START only
+places the players (Game.fromWorld) instead of generating a whole map in
+the MQTT callback. Every take() schedules a replacement. When the pool is
+empty, take() returns None and the caller generates the game in place.
+If a worker dies, e.g. killed for memory, the pool stops generating and
+take() hands out what is left, then None.
+"""
+
+import random
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
+
+from game import Game
+
+
+class World(NamedTuple):
+    height: int
+    width: int
+    codes: bytes  # Map.cellCodes() of the board, without players
+    numCoins: int
+    seed: int
+
+
+def generateWorld(height: int, width: int, seed: int, wallStyle: str = 'classic', wallOptions: Optional[dict] = None) -> World:
+    """
+    Runs in a worker process. Game.fromWorld on the result gives the same game as Game(..., seed=seed).
+    """
+    worldMap = Game.generateWorld(height, width, seed, True, wallStyle, wallOptions=wallOptions)
+    return World(height, width, worldMap.cellCodes(), worldMap.numCoins, seed)
+
+
+class WarmPool:
+    def __init__(self, sizes: list[tuple[int, int]], depth: int = 8, workers: int = 1, wallStyle: str = 'classic'):
+        """
+        :param sizes: Board sizes to keep ready, as (height, width)
+        :param depth: Worlds kept ready per size
+        :param workers: Worker processes generating worlds
+        """
+        assert depth > 0 and workers > 0
+        self.depth = depth
+        self.wallStyle = wallStyle
+        # Spawned workers don't inherit the server's threads or sockets
+        self.__executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        self.__lock = threading.Lock()
+        self.__ready: dict[tuple[int, int], deque[World]] = {size: deque() for size in sizes}
+        self.__pending: dict[tuple[int, int], int] = {size: 0 for size in sizes}
+        self.__closed = False
+        self.broken = False
+        for size in sizes:
+            self.__refill(size)
+
+    def take(self, height: int, width: int) -> Optional[World]:
+        """
+        :return: A ready world of that size, or None if none is ready or the size isn't pooled
+        """
+        size = (height, width)
+        ready = self.__ready.get(size)
+        if ready is None:
+            return None
+        try:
+            world = ready.popleft()
+        except IndexError:
+            world = None
+        self.__refill(size)
+        return world
+
+    def ready(self, height: int, width: int) -> int:
+        return len(self.__ready.get((height, width), ()))
+
+    def __refill(self, size: tuple[int, int]):
+        with self.__lock:
+            if self.__closed:
+                return
+            missing = self.depth - len(self.__ready[size]) - self.__pending[size]
+            self.__pending[size] += max(missing, 0)
+        for _ in range(missing):
+            try:
+                future = self.__executor.submit(generateWorld, *size, random.getrandbits(63), self.wallStyle)
+            except (BrokenProcessPool, RuntimeError) as error:
+                self.__disable(error)
+                return
+            future.add_done_callback(lambda done, size=size: self.__collect(size, done))
+
+    def __collect(self, size: tuple[int, int], future: Future):
+        # Runs on the executor's management thread
+        with self.__lock:
+            self.__pending[size] -= 1
+            if not future.cancelled() and future.exception() is None:
+                self.__ready[size].append(future.result())
+
+    def __disable(self, error: Exception):
+        with self.__lock:
+            if self.broken:
+                return
+            self.broken = True
+            self.__closed = True
+        print(f'Warm pool stopped, games are generated in place from now on: {error!r}')
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        with self.__lock:
+            self.__closed = True
+        self.__executor.shutdown(wait=False, cancel_futures=True)